@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BlogappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blogapp'
+
+    def ready(self):
+        """
+        Подключает сигналы приложения.
+        """
+
+        import blogapp.signals  # noqa: F401
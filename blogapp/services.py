@@ -1,5 +1,9 @@
+import random
+import time
+
 from django.conf import settings
 from django.core.cache import cache
+from django.db.models import Max, Min
 
 from blogapp.models import Article
 
@@ -22,3 +26,80 @@ def get_cached_article():
 
     return article_list
 
+
+ARTICLE_IDS_KEY = 'article_ids'
+ARTICLE_IDS_LOCK_KEY = 'article_ids_lock'
+ARTICLE_IDS_LOCK_TIMEOUT = 10
+
+
+def refresh_article_ids():
+    """
+    Читает id всех статей из БД и кладет их в кеш вместе со временем, после которого список нужно обновить.
+    Сама запись в кеше не истекает: устаревший список отдается, пока один запрос строит новый.
+    При выключенном кеше ничего не делает и возвращает None.
+    """
+
+    if not settings.CACHE_ENABLED:
+        return None
+    article_ids = list(Article.objects.values_list('pk', flat=True))
+    cache.set(ARTICLE_IDS_KEY, (article_ids, time.time() + settings.ARTICLE_IDS_CACHE_TIMEOUT), None)
+    return article_ids
+
+
+def get_article_ids():
+    """
+    Возвращает id всех статей из кеша.
+    Список пересчитывает только запрос, взявший блокировку в кеше (cache.add): когда список устарел,
+    остальные получают прежний список, а когда его еще нет — None, поэтому ни истечение, ни потеря кеша
+    не приводят к лавине одинаковых запросов к БД. При выключенном кеше возвращает None.
+    """
+
+    if not settings.CACHE_ENABLED:
+        return None
+
+    cached = cache.get(ARTICLE_IDS_KEY)
+    if cached is not None and time.time() < cached[1]:
+        return cached[0]
+    if not cache.add(ARTICLE_IDS_LOCK_KEY, True, ARTICLE_IDS_LOCK_TIMEOUT):
+        return cached[0] if cached is not None else None
+    try:
+        return refresh_article_ids()
+    finally:
+        cache.delete(ARTICLE_IDS_LOCK_KEY)
+
+
+def sample_articles_by_pk(count: int) -> list:
+    """
+    Возвращает до count случайных статей без списка id: для случайных точек между наименьшим и наибольшим id
+    берется первая статья с id не меньше точки. Статьи после пропусков в нумерации выпадают чаще,
+    зато хватает нескольких запросов по индексу первичного ключа при любом размере таблицы.
+    """
+
+    bounds = Article.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return []
+
+    articles = {}
+    for _ in range(count * 2):  # повторные попадания в одну статью не считаются
+        if len(articles) >= count:
+            break
+        pk = random.randint(bounds['first'], bounds['last'])
+        article = Article.objects.filter(pk__gte=pk).order_by('pk').first()
+        if article is not None:  # статьи с id от точки удалены после подсчета границ
+            articles.setdefault(article.pk, article)
+    return list(articles.values())
+
+
+def get_random_articles(count: int) -> list:
+    """
+    Возвращает до count случайных статей: id выбираются из списка get_article_ids,
+    а статьи читаются по первичному ключу, без сортировки всей таблицы (ORDER BY RANDOM()).
+    Если списка id нет (кеш выключен или список строит другой запрос), статьи выбираются по диапазону id.
+    """
+
+    article_ids = get_article_ids()
+    if article_ids is None:
+        return sample_articles_by_pk(count)
+    sample = random.sample(article_ids, min(count, len(article_ids)))
+    articles = Article.objects.in_bulk(sample)
+    return [articles[pk] for pk in sample if pk in articles]
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blogapp.models import Article
+from blogapp.services import refresh_article_ids
+
+
+@receiver(post_save, sender=Article)
+def article_created(sender, created, **kwargs):
+    """
+    Обновляет кешированный список id статей после добавления статьи.
+    Прочие сохранения (например, счетчик просмотров) список не меняют.
+    """
+
+    if created:
+        transaction.on_commit(refresh_article_ids)
+
+
+@receiver(post_delete, sender=Article)
+def article_deleted(sender, **kwargs):
+    """
+    Обновляет кешированный список id статей после удаления статьи.
+    """
+
+    transaction.on_commit(refresh_article_ids)
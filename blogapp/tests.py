@@ -1,3 +1,69 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from blogapp.models import Article
+from blogapp.services import (
+    ARTICLE_IDS_KEY, ARTICLE_IDS_LOCK_KEY, get_article_ids, get_random_articles, sample_articles_by_pk,
+)
+
+
+@override_settings(CACHE_ENABLED=True)
+class ArticleIdsCacheTest(TestCase):
+    """
+    Список id статей пересчитывает только один запрос.
+    """
+
+    def setUp(self):
+        cache.delete_many([ARTICLE_IDS_KEY, ARTICLE_IDS_LOCK_KEY])
+        for number in range(5):
+            Article.objects.create(article_name=f'Статья {number}')
+
+    def tearDown(self):
+        cache.delete_many([ARTICLE_IDS_KEY, ARTICLE_IDS_LOCK_KEY])
+
+    def test_cold_cache_is_rebuilt_by_lock_holder_only(self):
+        cache.add(ARTICLE_IDS_LOCK_KEY, True)  # список строит другой запрос
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_article_ids())
+        self.assertEqual(len(get_random_articles(3)), 3)
+
+        cache.delete(ARTICLE_IDS_LOCK_KEY)
+        self.assertEqual(len(get_article_ids()), 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_article_ids()), 5)
+
+    def test_stale_list_is_served_while_rebuilding(self):
+        cache.set(ARTICLE_IDS_KEY, ([1, 2], 0), None)
+        cache.add(ARTICLE_IDS_LOCK_KEY, True)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_article_ids(), [1, 2])
+
+
+@override_settings(CACHE_ENABLED=False)
+class RandomArticlesWithoutCacheTest(TestCase):
+    """
+    Без кеша случайные статьи выбираются по диапазону id, не читая всю таблицу.
+    """
+
+    def test_articles_are_sampled_by_pk(self):
+        for number in range(50):
+            Article.objects.create(article_name=f'Статья {number}')
+
+        with CaptureQueriesContext(connection) as queries:
+            articles = get_random_articles(3)
+        self.assertLessEqual(len(queries), 7)  # границы id и не больше двух запросов на статью
+        self.assertEqual(len({article.pk for article in articles}), len(articles))
+        self.assertGreaterEqual(len(articles), 1)
+
+    def test_articles_deleted_after_bounds_are_skipped(self):
+        article = Article.objects.create(article_name='Статья')
+
+        # точка попала на id удаленной после подсчета границ статьи, после которой статей нет
+        with mock.patch('blogapp.services.random.randint', side_effect=[article.pk + 1, article.pk]):
+            self.assertEqual(sample_articles_by_pk(1), [article])
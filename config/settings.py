@@ -168,6 +168,38 @@ CRONJOBS = [
     ('*/1 * * * *', 'mailingapp.services.send_mailing'),
 ]
 
+MAILING_DISPATCH_WORKERS = int(os.getenv('MAILING_DISPATCH_WORKERS') or 1)
+MAILING_DISPATCH_MAX_IN_FLIGHT = int(os.getenv('MAILING_DISPATCH_MAX_IN_FLIGHT') or 10)
+MAILING_RECIPIENTS_PER_MESSAGE = int(os.getenv('MAILING_RECIPIENTS_PER_MESSAGE') or 100)
+MAILING_DELIVERY_LOG_BATCH_SIZE = int(os.getenv('MAILING_DELIVERY_LOG_BATCH_SIZE') or 1000)
+MAILING_RETRY_MAX_ATTEMPTS = int(os.getenv('MAILING_RETRY_MAX_ATTEMPTS') or 5)
+MAILING_RETRY_BASE_DELAY = int(os.getenv('MAILING_RETRY_BASE_DELAY') or 60)
+MAILING_RETRY_MAX_DELAY = int(os.getenv('MAILING_RETRY_MAX_DELAY') or 3600)
+MAILING_ACCOUNT_RATE_PER_MINUTE = float(os.getenv('MAILING_ACCOUNT_RATE_PER_MINUTE') or 0)
+MAILING_ACCOUNT_BURST = int(os.getenv('MAILING_ACCOUNT_BURST') or 10)
+MAILING_DOMAIN_RATE_PER_MINUTE = float(os.getenv('MAILING_DOMAIN_RATE_PER_MINUTE') or 0)
+MAILING_DOMAIN_BURST = int(os.getenv('MAILING_DOMAIN_BURST') or 100)
+MAILING_CLAIM_BATCH_SIZE = int(os.getenv('MAILING_CLAIM_BATCH_SIZE') or 100)
+MAILING_CLAIM_LEASE_SECONDS = int(os.getenv('MAILING_CLAIM_LEASE_SECONDS') or 300)
+MAILING_SCHEDULER_IN_PROCESS = os.getenv('MAILING_SCHEDULER_IN_PROCESS') == 'True'
+MAILING_LEADER_LEASE_SECONDS = int(os.getenv('MAILING_LEADER_LEASE_SECONDS') or 120)
+MAILING_PAYLOAD_CACHE_SIZE = int(os.getenv('MAILING_PAYLOAD_CACHE_SIZE') or 256)
+MAILING_SEND_WINDOW_SECONDS = int(os.getenv('MAILING_SEND_WINDOW_SECONDS') or 0)
+MAILING_MAX_SENDS_PER_TICK = int(os.getenv('MAILING_MAX_SENDS_PER_TICK') or 0)
+MAILING_DISPATCHER_MAX_SLEEP = float(os.getenv('MAILING_DISPATCHER_MAX_SLEEP') or 60)
+MAILING_DISPATCHER_MIN_INTERVAL = float(os.getenv('MAILING_DISPATCHER_MIN_INTERVAL') or 1)
+MAILING_DISPATCHER_HEAP_SIZE = int(os.getenv('MAILING_DISPATCHER_HEAP_SIZE') or 100)
+MAILING_OUTBOX_ENABLED = os.getenv('MAILING_OUTBOX_ENABLED') == 'True'
+MAILING_OUTBOX_POLL_INTERVAL = float(os.getenv('MAILING_OUTBOX_POLL_INTERVAL') or 5)
+MAILING_BREAKER_WINDOW = int(os.getenv('MAILING_BREAKER_WINDOW') or 20)
+MAILING_BREAKER_MIN_REQUESTS = int(os.getenv('MAILING_BREAKER_MIN_REQUESTS') or 5)
+MAILING_BREAKER_FAILURE_RATE = float(os.getenv('MAILING_BREAKER_FAILURE_RATE') or 0.5)
+MAILING_BREAKER_OPEN_SECONDS = float(os.getenv('MAILING_BREAKER_OPEN_SECONDS') or 60)
+MAILING_STATS_CACHE_TIMEOUT = int(os.getenv('MAILING_STATS_CACHE_TIMEOUT') or 300)
+MAILING_STATS_HISTOGRAM_DAYS = int(os.getenv('MAILING_STATS_HISTOGRAM_DAYS') or 30)
+MAILING_ATTEMPT_RETENTION_DAYS = int(os.getenv('MAILING_ATTEMPT_RETENTION_DAYS') or 180)
+MAILING_ATTEMPT_ARCHIVE_DIR = Path(os.getenv('MAILING_ATTEMPT_ARCHIVE_DIR') or BASE_DIR / 'archive')
+
 APSCHEDULER_DATETIME_FORMAT = "N j, Y, f:s a"
 
 APSCHEDULER_RUN_NOW_TIMEOUT = 25
@@ -182,3 +214,5 @@ if CACHE_ENABLED:
             "TIMEOUT": 10,
         }
     }
+
+ARTICLE_IDS_CACHE_TIMEOUT = int(os.getenv('ARTICLE_IDS_CACHE_TIMEOUT') or 300)
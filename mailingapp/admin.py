@@ -1,13 +1,16 @@
 from django.contrib import admin
 
-from mailingapp.models import Client, Mailing, Message, Attempt
+from mailingapp.models import Client, Mailing, Message, Attempt, Delivery, DeliveryError, MailingClaim, \
+    DispatcherLease, OutboxMessage, Suppression, CircuitBreakerState, AttemptRollup, \
+    AttemptSummary, SiteCounter, RateLimitBucket
+from mailingapp.services import send_mailing_now
 
 
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'email_client', 'first_name', 'last_name',
-        'middle_name', 'comment_client', 'user',
+        'middle_name', 'comment_client', 'user', 'email_domain',
     )
 
 
@@ -15,8 +18,19 @@ class ClientAdmin(admin.ModelAdmin):
 class MailingAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'created_at', 'start_mailing', 'end_mailing',
-        'periodic_mailing', 'status_mailing', 'user', 'is_disabled', 'message',
+        'periodic_mailing', 'status_mailing', 'user', 'is_disabled', 'message', 'next_send_at',
+        'current_slot', 'retry_count',
     )
+    actions = ('send_now',)
+
+    @admin.action(description='Отправить сейчас')
+    def send_now(self, request, queryset):
+        queued = [mailing_id for mailing_id in queryset.values_list('pk', flat=True) if send_mailing_now(mailing_id)]
+        self.message_user(
+            request,
+            f"Поставлено в отправку рассылок: {len(queued)} из {queryset.count()}. "
+            f"Отключенные, завершенные и уже отправленные в текущем периоде рассылки пропущены.",
+        )
 
 
 @admin.register(Message)
@@ -30,4 +44,94 @@ class MessageAdmin(admin.ModelAdmin):
 class AttemptAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'last_attempt', 'status_attempt', 'answer_mail_server', 'mailing',
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(Delivery)
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'mailing', 'client', 'slot', 'status', 'smtp_code', 'error',
+    )
+    list_filter = ('status',)
+    raw_id_fields = ('mailing', 'client', 'error')
+
+
+@admin.register(DeliveryError)
+class DeliveryErrorAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'text',
+    )
+
+
+@admin.register(MailingClaim)
+class MailingClaimAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'mailing', 'slot', 'worker', 'lease_expires_at', 'completed_at',
+    )
+    raw_id_fields = ('mailing',)
+
+
+@admin.register(DispatcherLease)
+class DispatcherLeaseAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'holder', 'expires_at',
+    )
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'mailing', 'slot', 'domain', 'status', 'attempts', 'next_attempt_at', 'worker', 'lease_expires_at',
+    )
+    list_filter = ('status',)
+    raw_id_fields = ('mailing',)
+    exclude = ('payload',)
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'email', 'reason', 'comment', 'created_at',
+    )
+    list_filter = ('reason',)
+    search_fields = ('email',)
+
+
+@admin.register(CircuitBreakerState)
+class CircuitBreakerStateAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'worker', 'state', 'failure_rate', 'opened_at', 'updated_at',
+    )
+    list_filter = ('state',)
+
+
+@admin.register(AttemptRollup)
+class AttemptRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'date', 'mailing', 'user', 'successful_count', 'failed_count',
+    )
+    list_filter = ('date',)
+    raw_id_fields = ('mailing', 'user')
+
+
+@admin.register(AttemptSummary)
+class AttemptSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'mailing', 'successful_count', 'failed_count', 'last_success', 'last_failure', 'archived_until',
+    )
+    raw_id_fields = ('mailing',)
+
+
+@admin.register(SiteCounter)
+class SiteCounterAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'value',
+    )
+
+
+@admin.register(RateLimitBucket)
+class RateLimitBucketAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'key', 'tokens', 'updated',
+    )
+    search_fields = ('key',)
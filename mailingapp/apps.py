@@ -1,6 +1,5 @@
-from time import sleep
-
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MailingappConfig(AppConfig):
@@ -8,6 +7,13 @@ class MailingappConfig(AppConfig):
     name = 'mailingapp'
 
     def ready(self):
-        from mailingapp.services import start
-        sleep(2)
-        start()
+        """
+        Запускает фоновый планировщик рассылок только при MAILING_SCHEDULER_IN_PROCESS=True.
+        Обычно рассылки отправляет отдельный процесс: python manage.py rundispatcher или runapscheduler.
+        """
+
+        import mailingapp.signals  # noqa: F401
+
+        if settings.MAILING_SCHEDULER_IN_PROCESS:
+            from mailingapp.services import start
+            start()
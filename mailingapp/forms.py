@@ -1,7 +1,7 @@
 from django import forms
 from django.forms import BooleanField
 
-from mailingapp.models import Mailing, Client, Message
+from mailingapp.models import Mailing, Client, Message, Attempt
 
 
 class StyleFormMixin:
@@ -48,3 +48,18 @@ class MessageForm(StyleFormMixin, forms.ModelForm):
     class Meta:
         model = Message
         fields = ('message_title', 'message_text')
+        help_texts = {
+            'message_text': 'Можно подставить данные клиента: {{ first_name }}, {{ last_name }}, '
+                            '{{ middle_name }}, {{ email_client }}',
+        }
+
+
+class AttemptFilterForm(StyleFormMixin, forms.Form):
+    """
+    Форма фильтров списка попыток рассылок.
+    """
+
+    mailing = forms.IntegerField(label='Рассылка №', required=False, min_value=1)
+    status = forms.ChoiceField(label='Статус', required=False, choices=(('', 'все'), *Attempt.ATTEMPTS))
+    date_from = forms.DateField(label='С даты', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(label='По дату', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
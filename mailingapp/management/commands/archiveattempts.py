@@ -0,0 +1,116 @@
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from mailingapp.models import Attempt, AttemptSummary
+from mailingapp.services import invalidate_attempt_stats
+
+
+ARCHIVE_FIELDS = ('pk', 'mailing_id', 'last_attempt', 'status_attempt', 'answer_mail_server')
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: переносит попытки рассылок старше --days дней в сжатый архив JSONL
+    (по строке на попытку) и удаляет их из БД, добавляя их кол-во к итогам рассылки (AttemptSummary).
+    Попытки обрабатываются пакетами по --batch-size строк, каждый пакет — отдельная короткая транзакция,
+    поэтому память не зависит от объема истории, а строки не блокируются надолго.
+    Последняя попытка каждой рассылки остается в БД: по ней рассчитывается время следующей отправки.
+    Пакет записывается в архив до удаления из БД, поэтому при сбое попытки могут попасть в архив дважды, но не пропасть.
+    """
+
+    help = "Archives and deletes attempts older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.MAILING_ATTEMPT_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--output-dir', default=settings.MAILING_ATTEMPT_ARCHIVE_DIR)
+
+    def handle(self, *args, **options):
+        # граница выравнивается на полночь, чтобы дневные итоги (AttemptRollup) не делились архивом пополам
+        cutoff = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=options['days']), time.min))
+        newer = Attempt.objects.filter(mailing=OuterRef('mailing'), last_attempt__gt=OuterRef('last_attempt'))
+        attempts = Attempt.objects.filter(Exists(newer), last_attempt__lt=cutoff).order_by('last_attempt', 'pk')
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f"attempts-{timezone.now():%Y%m%d-%H%M%S-%f}.jsonl.gz"
+
+        archived_count, position = 0, Q()
+        with open(path, 'xb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+            while True:
+                with transaction.atomic():
+                    rows = list(attempts.filter(position).values_list(*ARCHIVE_FIELDS)[:options['batch_size']])
+                    if not rows:
+                        break
+                    for row in rows:
+                        record = dict(zip(ARCHIVE_FIELDS, row), last_attempt=row[2].isoformat())
+                        archive.write(json.dumps(record, ensure_ascii=False).encode() + b'\n')
+                    archive.flush()
+                    os.fsync(raw.fileno())
+
+                    mailing_ids = self.add_to_summaries(rows, cutoff)
+                    self.delete_attempts([row[0] for row in rows])
+                    transaction.on_commit(lambda ids=mailing_ids: invalidate_attempt_stats(ids))
+
+                archived_count += len(rows)
+                pk, _, last_attempt, *_ = rows[-1]
+                position = Q(last_attempt__gt=last_attempt) | Q(last_attempt=last_attempt, pk__gt=pk)
+
+        if not archived_count:
+            path.unlink()
+            self.stdout.write("No attempts to archive.")
+            return
+        self.stdout.write(f"Archived {archived_count} attempt(s) to {path}.")
+
+    @staticmethod
+    def add_to_summaries(rows: list, cutoff: datetime) -> list:
+        """
+        Добавляет пакет архивируемых попыток к итогам рассылок. Возвращает id затронутых рассылок.
+        """
+
+        counts = {}
+        for _, mailing_id, last_attempt, status_attempt, _ in rows:
+            if mailing_id is None:
+                continue
+            summary = counts.setdefault(mailing_id, {'successful_count': 0, 'failed_count': 0})
+            successful = status_attempt == 'Successfully'
+            summary['successful_count' if successful else 'failed_count'] += 1
+            field = 'last_success' if successful else 'last_failure'
+            summary[field] = max(summary.get(field, last_attempt), last_attempt)
+
+        for mailing_id, summary in counts.items():
+            updated = AttemptSummary.objects.filter(mailing_id=mailing_id).update(
+                archived_until=Greatest('archived_until', cutoff),
+                **{
+                    # Coalesce: на SQLite и MySQL Greatest с NULL возвращает NULL
+                    field: F(field) + value if field.endswith('_count') else Greatest(Coalesce(field, value), value)
+                    for field, value in summary.items()
+                },
+            )
+            if not updated:
+                AttemptSummary.objects.create(mailing_id=mailing_id, archived_until=cutoff, **summary)
+        return list(counts)
+
+    @staticmethod
+    def delete_attempts(pks: list):
+        """
+        Удаляет попытки одним запросом DELETE ... WHERE id IN (...) на любой БД. QuerySet.delete() загрузил бы
+        каждую попытку ради сигнала post_delete, поэтому кэш статистики сбрасывается один раз на пакет.
+        На попытки нет внешних ключей, так что каскадное удаление не требуется.
+        """
+
+        table = connection.ops.quote_name(Attempt._meta.db_table)
+        column = connection.ops.quote_name(Attempt._meta.pk.column)
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", pks)
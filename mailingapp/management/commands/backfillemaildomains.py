@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from mailingapp.models import Client
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: заполняет домен адреса (Client.email_domain) у клиентов, сохраненных до появления поля.
+    Клиенты читаются и обновляются пачками по --batch-size по возрастанию id, поэтому команду можно прервать
+    и запустить снова. Без домена клиенты не группируются по домену при отправке, а их адреса разбираются
+    при каждой отправке.
+    """
+
+    help = "Fills Client.email_domain for clients saved before the field existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        clients = Client.objects.filter(email_domain__isnull=True).order_by('pk').only('pk', 'email_client')
+        updated_count, last_pk = 0, 0
+
+        while batch := list(clients.filter(pk__gt=last_pk)[:options['batch_size']]):
+            for client in batch:
+                client.email_domain = Client.get_email_domain(client.email_client)
+            Client.objects.bulk_update(batch, ['email_domain'])
+            updated_count += len(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(f"Filled e-mail domain for {updated_count} client(s).")
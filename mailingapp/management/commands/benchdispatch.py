@@ -0,0 +1,278 @@
+import json
+import random
+import re
+import resource
+import socketserver
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from mailingapp.models import Client, Mailing, Message, Attempt
+from mailingapp.services import change_mailing_status, send_mailing, get_due_mailings
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """
+    Минимальный SMTP-сервер: принимает письма и никуда их не доставляет.
+    """
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    ADDRESS = re.compile(rb'<([^>]*)>')
+
+    def handle(self):
+        server = self.server
+        self.reply('220 benchmark sink')
+        accepted = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 benchmark sink')
+            elif command in (b'MAIL', b'RSET'):
+                if server.should_disconnect():
+                    return
+                accepted = []
+                self.reply('250 OK')
+            elif command == b'RCPT':
+                address = self.ADDRESS.search(line)
+                address = address.group(1).decode() if address else ''
+                refusal = server.check_recipient(address)
+                if refusal:
+                    self.reply(refusal)
+                else:
+                    accepted.append(address)
+                    self.reply('250 OK')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (line := self.rfile.readline()) not in (b'.\r\n', b'.\n', b''):
+                    data.append(line[1:] if line.startswith(b'.') else line)  # точка в начале строки удваивается
+                time.sleep(server.latency)
+                refusal = server.check_message()
+                if refusal:
+                    self.reply(refusal)
+                else:
+                    server.accept(accepted, b''.join(data))
+                    self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    """
+    Локальный SMTP-сервер для замеров с задержкой ответа latency секунд на письмо и внесением ошибок:
+    failure_rate — доля адресов, отклоненных с кодом 550, transient_rate — доля писем с ответом 451.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, latency: float, failure_rate: float, transient_rate: float, seed: int):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.transient_rate = transient_rate
+        self.random = random.Random(seed)
+        self.messages = 0
+        self.recipients = 0
+        self.lock = threading.Lock()
+
+    def should_fail(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+    def should_disconnect(self) -> bool:
+        """
+        Проверяет, нужно ли разорвать соединение перед следующим письмом.
+        """
+
+        return False
+
+    def check_recipient(self, address: str):
+        """
+        Возвращает ответ сервера, если адрес нужно отклонить, иначе None.
+        """
+
+        return '550 no such user' if self.should_fail(self.failure_rate) else None
+
+    def check_message(self):
+        """
+        Возвращает ответ сервера, если письмо нужно отклонить, иначе None.
+        """
+
+        return '451 try again later' if self.should_fail(self.transient_rate) else None
+
+    def accept(self, recipients: list, data: bytes):
+        """
+        Учитывает принятое письмо data для адресов recipients.
+        """
+
+        with self.lock:
+            self.messages += 1
+            self.recipients += len(recipients)
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: замер производительности отправки рассылок.
+    Во временной БД создаются N рассылок по M клиентов с K прошлыми попытками, затем проходы планировщика
+    (change_mailing_status и send_mailing) выполняются, пока не останется рассылок к отправке,
+    с локальным SMTP-сервером (задержка и ошибки настраиваются). Результат выводится в JSON:
+    писем и адресов в секунду, запросов к БД на проход, p50/p99 длительности прохода и пик памяти.
+    """
+
+    help = "Benchmarks the mailing dispatch pipeline against a local SMTP sink in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mailings', type=int, default=100)
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--attempts', type=int, default=10)
+        parser.add_argument('--domains', type=int, default=10)
+        parser.add_argument('--personalized', action='store_true')
+        parser.add_argument('--latency', type=float, default=0)
+        parser.add_argument('--failure-rate', type=float, default=0)
+        parser.add_argument('--transient-rate', type=float, default=0)
+        parser.add_argument('--ticks', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-tracemalloc', action='store_true')  # трассировка памяти замедляет проходы
+        parser.add_argument('--output')
+
+    def seed(self, options, current: datetime):
+        """
+        Наполняет временную БД: клиенты общие для всех рассылок, рассылки созданы, но еще не запущены.
+        """
+
+        text = 'Здравствуйте, {{ first_name }}!' if options['personalized'] else 'Текст рассылки'
+        message = Message.objects.create(message_title='Замер', message_text=text)
+        clients = Client.objects.bulk_create(
+            [
+                Client(
+                    email_client=f"client{number}@domain{number % options['domains']}.example.com",
+                    email_domain=f"domain{number % options['domains']}.example.com",
+                    first_name=f"Клиент {number}",
+                )
+                for number in range(options['clients'])
+            ],
+            batch_size=1000,
+        )
+        start = current - timedelta(minutes=1)
+        mailings = Mailing.objects.bulk_create(
+            [
+                Mailing(
+                    start_mailing=start,
+                    end_mailing=current + timedelta(days=30),
+                    periodic_mailing='once a day',
+                    status_mailing='created',
+                    message=message,
+                    next_send_at=start,
+                )
+                for _ in range(options['mailings'])
+            ],
+            batch_size=1000,
+        )
+        Through = Mailing.clients.through
+        Through.objects.bulk_create(
+            [Through(mailing_id=mailing.pk, client_id=client.pk) for mailing in mailings for client in clients],
+            batch_size=5000,
+        )
+        Attempt.objects.bulk_create(
+            [
+                Attempt(
+                    status_attempt='Successfully',
+                    answer_mail_server='',
+                    mailing=mailing,
+                    last_attempt=start - timedelta(days=number + 1),
+                )
+                for mailing in mailings for number in range(options['attempts'])
+            ],
+            batch_size=5000,
+        )
+
+    def run_ticks(self, options, sink: SinkServer) -> dict:
+        zone = pytz.timezone(settings.TIME_ZONE)
+        self.seed(options, datetime.now(zone))
+
+        tick_durations, tick_queries = [], []
+        if not options['no_tracemalloc']:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for _ in range(options['ticks']):
+            with CaptureQueriesContext(connection) as queries:
+                tick_started = time.perf_counter()
+                change_mailing_status()
+                send_mailing()
+                tick_durations.append(time.perf_counter() - tick_started)
+            tick_queries.append(len(queries))
+            if not get_due_mailings(datetime.now(zone)).exists():
+                break
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()  # без трассировки будет 0
+        tracemalloc.stop()
+
+        return {
+            'parameters': {
+                key: options[key] for key in (
+                    'mailings', 'clients', 'attempts', 'domains', 'personalized',
+                    'latency', 'failure_rate', 'transient_rate', 'ticks', 'seed',
+                )
+            },
+            'ticks': len(tick_durations),
+            'elapsed_seconds': elapsed,
+            'messages': sink.messages,
+            'recipients': sink.recipients,
+            'messages_per_second': sink.messages / elapsed if elapsed else 0,
+            'recipients_per_second': sink.recipients / elapsed if elapsed else 0,
+            'queries_per_tick': tick_queries,
+            'tick_duration_p50': percentile(tick_durations, 0.5),
+            'tick_duration_p99': percentile(tick_durations, 0.99),
+            'peak_traced_memory_bytes': peak_memory,
+            'max_rss_kilobytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        sink = SinkServer(options['latency'], options['failure_rate'], options['transient_rate'], options['seed'])
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                    EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                    EMAIL_HOST='127.0.0.1',
+                    EMAIL_PORT=sink.server_address[1],
+                    EMAIL_USE_SSL=False,
+                    EMAIL_USE_TLS=False,
+                    EMAIL_HOST_USER='benchmark@example.com',
+                    EMAIL_HOST_PASSWORD='',
+                    MAILING_OUTBOX_ENABLED=False,
+            ):
+                result = self.run_ticks(options, sink)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            sink.shutdown()
+            sink.server_close()
+
+        output = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        self.stdout.write(output)
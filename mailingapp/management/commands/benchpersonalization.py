@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Template
+
+from mailingapp.models import Client, Message
+from mailingapp.services import MessageTemplate, RECIPIENT_FIELDS
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: замер скорости персонализации сообщения (получателей в секунду).
+    Получатели берутся потоком из клиентов БД (--from-db) или генерируются.
+    Для сравнения замеряется наивная отрисовка django.template.Template на каждого получателя.
+    """
+
+    help = "Benchmarks message personalization in recipients per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument('message_id', type=int)
+        parser.add_argument('--recipients', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--from-db', action='store_true')
+        parser.add_argument('--skip-naive', action='store_true')
+
+    def get_recipients(self, options):
+        if options['from_db']:
+            return Client.objects.order_by('pk').values_list(*RECIPIENT_FIELDS).iterator(
+                chunk_size=options['batch_size'],
+            )
+        return (
+            (number, f'client{number}@example.com', f'Имя{number}', f'Фамилия{number}', None)
+            for number in range(options['recipients'])
+        )
+
+    def handle(self, *args, **options):
+        try:
+            message = Message.objects.get(pk=options['message_id'])
+        except Message.DoesNotExist:
+            raise CommandError(f"Message {options['message_id']} does not exist.")
+
+        started = time.perf_counter()
+        template = MessageTemplate(message)
+        compile_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        count = 0
+        for recipient in self.get_recipients(options):
+            template.render_payload(recipient)
+            count += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Compiled in {compile_time * 1000:.2f} ms, rendered {count} recipients in {elapsed:.2f} s: "
+            f"{count / elapsed if elapsed else 0:.0f} recipients/sec"
+        )
+
+        if options['skip_naive']:
+            return
+
+        started = time.perf_counter()
+        count = 0
+        for recipient in self.get_recipients(options):
+            Template(message.message_text).render(Context(dict(zip(RECIPIENT_FIELDS, recipient))))
+            count += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Naive Template().render: {count / elapsed if elapsed else 0:.0f} recipients/sec"
+        )
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime
+
+import pytz
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from mailingapp.models import CircuitBreakerState, OutboxMessage
+from mailingapp.services import get_retry_queue_stats
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: выводит в JSON состояние отправки рассылок для мониторинга —
+    предохранители процессов-отправителей, очередь повторов и исходящую очередь.
+    """
+
+    help = "Prints mailing delivery status as JSON."
+
+    def handle(self, *args, **options):
+        current_datetime = datetime.now(pytz.timezone(settings.TIME_ZONE))
+        outbox = dict(
+            OutboxMessage.objects.order_by().values_list('status').annotate(count=Count('pk')).values_list(
+                'status', 'count',
+            )
+        )
+        status = {
+            'circuit_breakers': [
+                {
+                    'worker': breaker.worker,
+                    'state': breaker.state,
+                    'failure_rate': breaker.failure_rate,
+                    'opened_at': breaker.opened_at.isoformat() if breaker.opened_at else None,
+                    'updated_at': breaker.updated_at.isoformat(),
+                }
+                for breaker in CircuitBreakerState.objects.all()
+            ],
+            'retry_queue': get_retry_queue_stats(current_datetime),
+            'outbox': {
+                name: outbox.get(value, 0)
+                for value, name in (
+                    (OutboxMessage.STATUS_PENDING, 'pending'),
+                    (OutboxMessage.STATUS_SENT, 'sent'),
+                    (OutboxMessage.STATUS_FAILED, 'failed'),
+                )
+            },
+        }
+        self.stdout.write(json.dumps(status, indent=2))
@@ -0,0 +1,77 @@
+import mailbox
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mailingapp.models import Suppression
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: разбирает локальный почтовый ящик с возвратами (mbox или maildir)
+    и добавляет в стоп-лист адреса с окончательным отказом доставки (DSN со статусом 5.x.x
+    или заголовок X-Failed-Recipients).
+    Письма читаются по одному, адреса сохраняются пачками по --batch-size.
+    """
+
+    help = "Adds hard-bounced addresses from a mbox/maildir mailbox to the suppression list."
+
+    ADDRESS = re.compile(r'[^\s<>;,]+@[^\s<>;,]+')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('mbox', 'maildir'), default='mbox')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def get_bounces(self, message):
+        """
+        Возвращает пары (адрес, диагностика) окончательных отказов из письма о недоставке.
+        """
+
+        for part in message.walk():
+            if part.get_content_type() != 'message/delivery-status':
+                continue
+            for fields in part.get_payload()[1:]:  # первый блок описывает сообщение, остальные — получателей
+                action = (fields.get('Action') or '').strip().lower()
+                status = (fields.get('Status') or '').strip()
+                recipient = fields.get('Final-Recipient') or fields.get('Original-Recipient') or ''
+                if action == 'failed' and status.startswith('5'):
+                    for address in self.ADDRESS.findall(recipient.split(';', 1)[-1]):
+                        yield address, f"{status} {fields.get('Diagnostic-Code') or ''}".strip()
+
+        for address in self.ADDRESS.findall(message.get('X-Failed-Recipients') or ''):
+            yield address, 'X-Failed-Recipients'
+
+    @staticmethod
+    def save(rows: dict):
+        Suppression.objects.bulk_create(
+            [Suppression(email=email, reason='bounce', comment=comment) for email, comment in rows.items()],
+            ignore_conflicts=True,
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['format'] == 'maildir':
+                box = mailbox.Maildir(options['path'], factory=None, create=False)
+            else:
+                box = mailbox.mbox(options['path'], create=False)
+        except (FileNotFoundError, mailbox.NoSuchMailboxError) as e:
+            raise CommandError(f"Mailbox {options['path']} not found: {e}")
+
+        messages_count, bounces_count = 0, 0
+        rows = {}
+        try:
+            for message in box.itervalues():
+                messages_count += 1
+                for address, comment in self.get_bounces(message):
+                    rows[address.lower()] = comment
+                if len(rows) >= options['batch_size']:
+                    bounces_count += len(rows)
+                    self.save(rows)
+                    rows = {}
+        finally:
+            box.close()
+
+        bounces_count += len(rows)
+        self.save(rows)
+        self.stdout.write(f"Processed {messages_count} message(s), hard-bounced addresses: {bounces_count}.")
@@ -0,0 +1,50 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from mailingapp.models import Attempt, AttemptRollup, AttemptSummary, Mailing
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: пересчитывает дневные итоги попыток рассылок (AttemptRollup) по всей истории.
+    Попытки агрегируются в БД по --chunk-size рассылок за запрос, поэтому память не зависит от размера истории.
+    Итоги заменяются одной транзакцией; для точного результата запускайте при остановленной отправке рассылок.
+    Итоги за дни, попытки которых перенесены в архив командой archiveattempts, не пересчитываются.
+    """
+
+    help = "Rebuilds daily attempt rollups from the attempt history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        successful = Q(status_attempt='Successfully')
+        mailings = Mailing.objects.order_by('pk').values_list('pk', 'user_id').iterator(
+            chunk_size=options['chunk_size'],
+        )
+        rollups, attempts = AttemptRollup.objects.all(), Attempt.objects.all()
+        archived_until = AttemptSummary.objects.aggregate(Max('archived_until'))['archived_until__max']
+        if archived_until is not None:
+            rollups = rollups.filter(date__gte=timezone.localdate(archived_until))
+            attempts = attempts.filter(last_attempt__gte=archived_until)
+        rollups_count = 0
+
+        with transaction.atomic():
+            rollups.delete()
+            while chunk := dict(islice(mailings, options['chunk_size'])):
+                rows = attempts.filter(mailing_id__in=chunk).annotate(
+                    date=TruncDate('last_attempt'),
+                ).values('date', 'mailing_id').annotate(
+                    successful_count=Count('pk', filter=successful),
+                    failed_count=Count('pk', filter=~successful),
+                ).order_by()
+                rollups_count += len(AttemptRollup.objects.bulk_create(
+                    [AttemptRollup(user_id=chunk[row['mailing_id']], **row) for row in rows],
+                ))
+
+        self.stdout.write(f"Rebuilt {rollups_count} rollup(s).")
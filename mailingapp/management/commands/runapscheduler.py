@@ -8,7 +8,7 @@ from django.core.management.base import BaseCommand
 from django_apscheduler.jobstores import DjangoJobStore
 
 
-from mailingapp.services import change_mailing_status, send_mailing
+from mailingapp.services import run_change_mailing_status, run_send_mailing, release_leadership, get_worker_id
 
 
 logger = logging.getLogger(__name__)
@@ -17,6 +17,7 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     """
     Кастомная команда автоматически запускает рассылки.
+    Задачи выполняет только ведущий процесс, поэтому команду можно запускать на нескольких серверах.
     """
 
     help = "Runs APScheduler."
@@ -26,7 +27,7 @@ class Command(BaseCommand):
         scheduler.add_jobstore(DjangoJobStore(), "default")
 
         scheduler.add_job(
-            change_mailing_status,
+            run_change_mailing_status,
             trigger=CronTrigger(second="*/59"),
             id="change_mailing_status",
             max_instances=1,
@@ -35,7 +36,7 @@ class Command(BaseCommand):
         logger.info("Added job 'change_mailing_status'.")
 
         scheduler.add_job(
-            send_mailing,
+            run_send_mailing,
             trigger=CronTrigger(second="*/59"),
             id="send_mailing",
             max_instances=1,
@@ -51,4 +52,5 @@ class Command(BaseCommand):
         except KeyboardInterrupt:
             logger.info("Stopping scheduler...")
             scheduler.shutdown()
+            release_leadership(get_worker_id())
             logger.info("Scheduler shut down successfully!")
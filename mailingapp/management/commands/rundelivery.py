@@ -0,0 +1,32 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mailingapp.management.commands.rundispatcher import Wakeup
+from mailingapp.services import deliver_outbox, OUTBOX_CHANNEL
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: процесс доставки писем из исходящей очереди (MAILING_OUTBOX_ENABLED).
+    Планировщик только записывает письма в очередь, поэтому доставку можно запускать
+    в нескольких процессах независимо от планировщика.
+    """
+
+    help = "Runs outbox delivery worker."
+
+    def handle(self, *args, **options):
+        wakeup = Wakeup(OUTBOX_CHANNEL)
+        logger.info("Starting delivery worker...")
+
+        try:
+            while True:
+                wakeup.listen()
+                if not deliver_outbox():
+                    wakeup.wait(settings.MAILING_OUTBOX_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            logger.info("Delivery worker stopped.")
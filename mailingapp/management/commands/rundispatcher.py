@@ -0,0 +1,95 @@
+import heapq
+import logging
+import select
+import time
+from datetime import datetime
+
+import pytz
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mailingapp.services import change_mailing_status, send_mailing, get_upcoming_events, DISPATCHER_CHANNEL
+
+
+logger = logging.getLogger(__name__)
+
+
+class Wakeup:
+    """
+    Ожидание уведомлений канала channel через PostgreSQL LISTEN.
+    На других БД и драйверах просто спит до таймаута.
+    """
+
+    def __init__(self, channel: str = DISPATCHER_CHANNEL):
+        self.channel = channel
+        self.listening = None
+
+    def listen(self):
+        connection.ensure_connection()
+        raw_connection = connection.connection
+        if connection.vendor != 'postgresql' or not hasattr(raw_connection, 'poll'):
+            return
+        if raw_connection is not self.listening:  # после переподключения подписываемся заново
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            self.listening = raw_connection
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Ждет уведомления не дольше timeout секунд. Возвращает True, если уведомление пришло.
+        """
+
+        if self.listening is None:
+            time.sleep(timeout)
+            return False
+
+        ready, _, _ = select.select([self.listening], [], [], timeout)
+        if ready:
+            self.listening.poll()
+        woken = bool(self.listening.notifies)
+        self.listening.notifies.clear()
+        return woken
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда: диспетчер рассылок, который спит до ближайшего события
+    (старт, окончание или очередная отправка рассылки) вместо опроса раз в минуту.
+    Изменение рассылки будит диспетчер сразу (см. mailingapp.signals).
+    """
+
+    help = "Runs event-driven mailing dispatcher."
+
+    def handle(self, *args, **options):
+        zone = pytz.timezone(settings.TIME_ZONE)
+        wakeup = Wakeup()
+        logger.info("Starting dispatcher...")
+
+        try:
+            while True:
+                wakeup.listen()
+                started = time.monotonic()
+                current_datetime = datetime.now(zone)
+                events = get_upcoming_events(current_datetime, settings.MAILING_DISPATCHER_HEAP_SIZE)
+
+                due_events = set()
+                while events and events[0][0] <= current_datetime:
+                    due_events.add(events[0][1])
+                    heapq.heappop(events)
+
+                if due_events & {'start', 'end'}:
+                    change_mailing_status()
+                if due_events:
+                    send_mailing()
+                    # состояние рассылок изменилось: пересобираем кучу, но не чаще MAILING_DISPATCHER_MIN_INTERVAL
+                    wakeup.wait(max(settings.MAILING_DISPATCHER_MIN_INTERVAL - (time.monotonic() - started), 0))
+                    continue
+
+                timeout = settings.MAILING_DISPATCHER_MAX_SLEEP
+                if events:
+                    timeout = min(timeout, (events[0][0] - current_datetime).total_seconds())
+                if wakeup.wait(timeout):
+                    logger.debug("Dispatcher woken by mailing change.")
+        except KeyboardInterrupt:
+            logger.info("Dispatcher stopped.")
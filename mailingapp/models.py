@@ -1,3 +1,8 @@
+from datetime import timedelta
+from email.header import Header
+from email.mime.text import MIMEText
+
+from django.conf import settings
 from django.db import models
 
 from usersapp.models import User
@@ -15,6 +20,7 @@ class Client(models.Model):
     last_name = models.CharField(max_length=100, verbose_name='фамилия', **NULLABLE)
     middle_name = models.CharField(max_length=100, verbose_name='отчество', **NULLABLE)
     comment_client = models.TextField(verbose_name="комментарий", **NULLABLE)
+    email_domain = models.CharField(max_length=255, verbose_name='домен адреса', db_index=True, **NULLABLE)
 
     user = models.ForeignKey(
         User,
@@ -26,6 +32,25 @@ class Client(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name} (e-mail: {self.email_client})"
 
+    @staticmethod
+    def get_email_domain(email: str) -> str:
+        """
+        Возвращает домен электронного адреса в нижнем регистре.
+        """
+
+        return email.rsplit('@', 1)[-1].lower()
+
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет домен адреса для группировки получателей при отправке.
+        """
+
+        self.email_domain = self.get_email_domain(self.email_client)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'email_client' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'email_domain'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Клиент"
         verbose_name_plural = "Клиенты"
@@ -47,6 +72,11 @@ class Mailing(models.Model):
         ('launched', 'запущена'),
         ('completed', 'завершена'),
     )
+    PERIOD_DELTAS = {
+        'once a day': timedelta(days=1),
+        'once a week': timedelta(days=7),
+        'once a month': timedelta(days=30),
+    }
     created_at = models.DateField(auto_now_add=True, verbose_name="дата создания")
     start_mailing = models.DateTimeField(verbose_name="дата и время 1 отправки рассылки")
     end_mailing = models.DateTimeField(verbose_name="дата и время окончания рассылки")
@@ -83,10 +113,80 @@ class Mailing(models.Model):
         **NULLABLE,
         verbose_name='сообщение',
     )
+    next_send_at = models.DateTimeField(
+        verbose_name='дата и время следующей отправки',
+        **NULLABLE,
+    )
+    current_slot = models.DateTimeField(
+        verbose_name='период, отправка которого повторяется',
+        **NULLABLE,
+    )
+    retry_count = models.PositiveSmallIntegerField(
+        verbose_name='кол-во повторных попыток',
+        default=0,
+    )
 
     def __str__(self):
         return f"Рассылка: {self.pk}, создана: {self.created_at}, статус: {self.status_mailing}"
 
+    def get_next_send_at(self, last_attempt, current=None):
+        """
+        Возвращает дату и время следующей отправки через период после last_attempt
+        (для отправки по расписанию — после запланированного времени отправки периода).
+        Если передан current, пропущенные периоды не догоняются: отправка назначается на первый период после current.
+        Для неизвестной периодичности возвращает окончание рассылки: больше она не отправляется.
+        Если задано окно MAILING_SEND_WINDOW_SECONDS, отправка переносится к ближайшему (не дальше половины окна)
+        постоянному для рассылки смещению внутри окна, чтобы рассылки с одинаковым временем
+        последней попытки не уходили в одну и ту же минуту. Время, уже стоящее на смещении, не сдвигается,
+        поэтому расписание не уплывает от периода к периоду.
+        """
+
+        period = self.PERIOD_DELTAS.get(self.periodic_mailing)
+        if period is None:
+            return self.end_mailing
+
+        next_send_at = last_attempt + period
+        if current is not None and next_send_at <= current:
+            next_send_at += period * ((current - next_send_at) // period + 1)
+        window = settings.MAILING_SEND_WINDOW_SECONDS
+        if not window or self.pk is None:
+            return next_send_at
+
+        shift = next_send_at.timestamp() // window * window + self.get_send_offset(window) - next_send_at.timestamp()
+        if shift > window / 2:
+            shift -= window
+        elif shift < -window / 2:
+            shift += window
+        return next_send_at + timedelta(seconds=shift)
+
+    def get_send_offset(self, window: int) -> int:
+        """
+        Возвращает постоянное смещение рассылки внутри окна отправки (в секундах).
+        """
+
+        return self.pk * 2654435761 % 2 ** 32 % window
+
+    def save(self, *args, **kwargs):
+        """
+        Первая отправка новой рассылки назначается на дату старта.
+        При изменении старта или периодичности сбрасывает расписание и повторы отправки: время следующей
+        отправки один раз рассчитывается по последней попытке (см. services.is_mailing_due).
+        """
+
+        if self._state.adding:
+            if self.next_send_at is None:
+                self.next_send_at = self.start_mailing
+        elif self.pk is not None:
+            saved = Mailing.objects.filter(pk=self.pk).values_list('start_mailing', 'periodic_mailing').first()
+            if saved and saved != (self.start_mailing, self.periodic_mailing):
+                self.next_send_at = None
+                self.current_slot = None
+                self.retry_count = 0
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'next_send_at', 'current_slot', 'retry_count'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Рассылка"
         verbose_name_plural = "Рассылки"
@@ -94,6 +194,12 @@ class Mailing(models.Model):
             ("сan_disabled_mailings", "Сan disabled mailings"),
         ]
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status_mailing', 'next_send_at'], name='mailing_status_next_send_idx'),
+            models.Index(fields=['status_mailing', 'is_disabled', 'start_mailing'], name='mailing_status_start_idx'),
+            models.Index(fields=['status_mailing', 'is_disabled', 'end_mailing'], name='mailing_status_end_idx'),
+            models.Index(fields=['current_slot'], name='mailing_retry_queue_idx', condition=models.Q(retry_count__gt=0)),
+        ]
 
 
 class Message(models.Model):
@@ -109,10 +215,41 @@ class Message(models.Model):
         **NULLABLE,
         on_delete=models.SET_NULL
     )
+    version = models.PositiveIntegerField(default=1, verbose_name='версия сообщения')
+    mime_payload = models.BinaryField(verbose_name='собранное MIME-сообщение', editable=False, **NULLABLE)
 
     def __str__(self):
         return f"Сообщение для рассылки: {self.message_title}"
 
+    def build_mime_payload(self) -> bytes:
+        """
+        Собирает MIME-сообщение: тема, заголовки MIME и тело в base64.
+        Заголовки конверта (From, To, Date, Message-ID) добавляются при каждой отправке.
+        """
+
+        mime = MIMEText(self.message_text, 'plain', 'utf-8')
+        mime['Subject'] = Header(self.message_title, 'utf-8')
+        return mime.as_bytes(policy=mime.policy.clone(linesep='\r\n'))
+
+    def save(self, *args, **kwargs):
+        """
+        При изменении темы или текста увеличивает версию сообщения и пересобирает MIME-сообщение.
+        """
+
+        if self.pk is not None:
+            saved = Message.objects.filter(pk=self.pk).values('message_title', 'message_text').first()
+            if saved and (saved['message_title'], saved['message_text']) != (self.message_title, self.message_text):
+                self.version += 1
+                self.mime_payload = None
+
+        if self.mime_payload is None:
+            self.mime_payload = self.build_mime_payload()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version', 'mime_payload'}
+
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Сообщение для рассылки"
         verbose_name_plural = "Сообщения для рассылок"
@@ -152,3 +289,304 @@ class Attempt(models.Model):
         verbose_name = "Попытка"
         verbose_name_plural = "Попытки"
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['mailing', 'last_attempt', 'id'], name='attempt_mailing_last_idx'),
+            models.Index(fields=['last_attempt', 'id'], name='attempt_last_idx'),
+        ]
+
+
+class DeliveryError(models.Model):
+    """
+    Модель: текст ошибки почтового сервера.
+    Одинаковые тексты хранятся один раз, доставки ссылаются на них.
+    """
+
+    text_hash = models.CharField(max_length=40, unique=True, verbose_name='хэш текста ошибки')
+    text = models.TextField(verbose_name='текст ошибки')
+
+    def __str__(self):
+        return self.text
+
+    class Meta:
+        verbose_name = "Ошибка доставки"
+        verbose_name_plural = "Ошибки доставки"
+        ordering = ['-id']
+
+
+class Delivery(models.Model):
+    """
+    Модель: доставка письма рассылки одному клиенту в одном периоде рассылки.
+    """
+
+    STATUS_SENT = 1
+    STATUS_REFUSED = 2
+    STATUS_FAILED = 3
+    STATUSES = (
+        (STATUS_SENT, 'отправлено'),
+        (STATUS_REFUSED, 'адрес отклонен сервером'),
+        (STATUS_FAILED, 'ошибка отправки'),
+    )
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name='клиент')
+    slot = models.DateTimeField(verbose_name='период рассылки')
+    status = models.PositiveSmallIntegerField(choices=STATUSES, verbose_name='статус доставки')
+    smtp_code = models.PositiveSmallIntegerField(verbose_name='код ответа сервера', **NULLABLE)
+    error = models.ForeignKey(
+        DeliveryError,
+        on_delete=models.PROTECT,
+        verbose_name='ошибка',
+        **NULLABLE,
+    )
+
+    def __str__(self):
+        return f"Доставка: рассылка {self.mailing_id}, клиент {self.client_id}, статус: {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Доставка"
+        verbose_name_plural = "Доставки"
+        ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(fields=['mailing', 'slot', 'client'], name='delivery_mailing_slot_client_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['mailing', 'slot', 'status'], name='delivery_slot_status_idx'),
+        ]
+
+
+class MailingClaim(models.Model):
+    """
+    Модель: захват отправки периода рассылки процессом-отправителем.
+    Пара (рассылка, период) уникальна; захват действует до lease_expires_at, после чего
+    незавершенную отправку может забрать другой процесс.
+    """
+
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    slot = models.DateTimeField(verbose_name='период рассылки')
+    worker = models.CharField(max_length=150, verbose_name='процесс-отправитель')
+    lease_expires_at = models.DateTimeField(verbose_name='захват действует до', **NULLABLE)
+    completed_at = models.DateTimeField(verbose_name='дата и время завершения отправки', **NULLABLE)
+
+    def __str__(self):
+        return f"Захват рассылки {self.mailing_id} за {self.slot}: {self.worker}"
+
+    class Meta:
+        verbose_name = "Захват рассылки"
+        verbose_name_plural = "Захваты рассылок"
+        ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(fields=['mailing', 'slot'], name='mailing_claim_mailing_slot_uniq'),
+        ]
+
+
+class DispatcherLease(models.Model):
+    """
+    Модель: право процесса быть ведущим планировщиком рассылок.
+    Ведущим считается процесс holder, пока не наступило expires_at.
+    """
+
+    name = models.CharField(max_length=100, unique=True, verbose_name='название роли')
+    holder = models.CharField(max_length=150, verbose_name='процесс')
+    expires_at = models.DateTimeField(verbose_name='действует до')
+
+    def __str__(self):
+        return f"{self.name}: {self.holder} (до {self.expires_at})"
+
+    class Meta:
+        verbose_name = "Ведущий планировщик"
+        verbose_name_plural = "Ведущие планировщики"
+
+
+class OutboxMessage(models.Model):
+    """
+    Модель: готовое к отправке письмо рассылки в исходящей очереди.
+    Планировщик записывает письма периода рассылки в очередь одной транзакцией,
+    процесс доставки (команда rundelivery) отправляет их и отмечает результат.
+    """
+
+    STATUS_PENDING = 1
+    STATUS_SENT = 2
+    STATUS_FAILED = 3
+    STATUSES = (
+        (STATUS_PENDING, 'ожидает отправки'),
+        (STATUS_SENT, 'отправлено'),
+        (STATUS_FAILED, 'не отправлено'),
+    )
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    slot = models.DateTimeField(verbose_name='период рассылки')
+    domain = models.CharField(max_length=255, verbose_name='домен получателей')
+    recipients = models.JSONField(verbose_name='получатели')  # пары [id клиента, адрес]
+    from_email = models.CharField(max_length=254, verbose_name='отправитель')
+    payload = models.BinaryField(verbose_name='письмо')
+    status = models.PositiveSmallIntegerField(choices=STATUSES, default=STATUS_PENDING, verbose_name='статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='кол-во попыток отправки')
+    next_attempt_at = models.DateTimeField(verbose_name='дата и время следующей попытки')
+    worker = models.CharField(max_length=150, verbose_name='процесс доставки', **NULLABLE)
+    lease_expires_at = models.DateTimeField(verbose_name='захват действует до', **NULLABLE)
+    error = models.TextField(verbose_name='ошибка', **NULLABLE)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата и время постановки в очередь')
+
+    def __str__(self):
+        return f"Письмо рассылки {self.mailing_id} за {self.slot}: {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = "Письмо в очереди"
+        verbose_name_plural = "Исходящая очередь"
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+            models.Index(fields=['mailing', 'slot', 'status'], name='outbox_slot_status_idx'),
+        ]
+
+
+class Suppression(models.Model):
+    """
+    Модель: адрес, на который рассылки не отправляются (окончательный отказ сервера, отписка, жалоба).
+    """
+
+    REASONS = (
+        ('bounce', 'адрес не существует'),
+        ('unsubscribe', 'отписка'),
+        ('complaint', 'жалоба на спам'),
+    )
+    email = models.EmailField(verbose_name='электронный адрес', unique=True)
+    reason = models.CharField(max_length=20, choices=REASONS, default='bounce', verbose_name='причина')
+    comment = models.TextField(verbose_name='комментарий', **NULLABLE)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата и время добавления')
+
+    def __str__(self):
+        return f"{self.email} ({self.get_reason_display()})"
+
+    def save(self, *args, **kwargs):
+        """
+        Хранит адрес в нижнем регистре, чтобы проверка при отправке не зависела от регистра.
+        """
+
+        self.email = self.email.lower()
+        super().save(*args, **kwargs)
+
+    class Meta:
+        verbose_name = "Адрес в стоп-листе"
+        verbose_name_plural = "Стоп-лист"
+        ordering = ['-id']
+
+
+class CircuitBreakerState(models.Model):
+    """
+    Модель: состояние предохранителя отправки писем процесса-отправителя.
+    Процесс сохраняет состояние при каждом его изменении, запись нужна только для мониторинга.
+    """
+
+    STATES = (
+        ('closed', 'замкнут: письма отправляются'),
+        ('open', 'разомкнут: отправка приостановлена'),
+        ('half_open', 'пробная отправка'),
+    )
+    worker = models.CharField(max_length=150, unique=True, verbose_name='процесс-отправитель')
+    state = models.CharField(max_length=20, choices=STATES, verbose_name='состояние')
+    failure_rate = models.FloatField(default=0, verbose_name='доля ошибок')
+    opened_at = models.DateTimeField(verbose_name='дата и время размыкания', **NULLABLE)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='дата и время изменения')
+
+    def __str__(self):
+        return f"{self.worker}: {self.get_state_display()}"
+
+    class Meta:
+        verbose_name = "Предохранитель отправки"
+        verbose_name_plural = "Предохранители отправки"
+        ordering = ['worker']
+
+
+class AttemptRollup(models.Model):
+    """
+    Модель: итоги попыток рассылки за день.
+    Обновляется при сохранении попыток (см. add_attempts_to_rollups), пересчитывается командой rebuildrollups.
+    """
+
+    date = models.DateField(verbose_name='дата')
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    user = models.ForeignKey(
+        User,
+        verbose_name='пользователь',
+        **NULLABLE,
+        on_delete=models.SET_NULL
+    )
+    successful_count = models.PositiveIntegerField(default=0, verbose_name='кол-во успешных попыток')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='кол-во неуспешных попыток')
+
+    def __str__(self):
+        return f"Рассылка {self.mailing_id} за {self.date}: успешно {self.successful_count}, " \
+               f"не успешно {self.failed_count}"
+
+    class Meta:
+        verbose_name = "Итоги попыток за день"
+        verbose_name_plural = "Итоги попыток по дням"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'mailing'], name='attempt_rollup_date_mailing_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='attempt_rollup_user_date_idx'),
+        ]
+
+
+class AttemptSummary(models.Model):
+    """
+    Модель: итоги попыток рассылки, перенесенных в архив командой archiveattempts.
+    """
+
+    mailing = models.OneToOneField(Mailing, on_delete=models.CASCADE, verbose_name='рассылка')
+    successful_count = models.PositiveIntegerField(default=0, verbose_name='кол-во успешных попыток')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='кол-во неуспешных попыток')
+    last_success = models.DateTimeField(verbose_name='последняя успешная попытка', **NULLABLE)
+    last_failure = models.DateTimeField(verbose_name='последняя неуспешная попытка', **NULLABLE)
+    archived_until = models.DateTimeField(verbose_name='архивированы попытки до')
+
+    def __str__(self):
+        return f"Рассылка {self.mailing_id} до {self.archived_until}: успешно {self.successful_count}, " \
+               f"не успешно {self.failed_count}"
+
+    class Meta:
+        verbose_name = "Итоги архивированных попыток"
+        verbose_name_plural = "Итоги архивированных попыток"
+
+
+class SiteCounter(models.Model):
+    """
+    Модель: счетчик главной страницы. Обновляется при изменении рассылок и клиентов (см. mailingapp.signals),
+    поэтому главная страница не считает строки таблиц.
+    """
+
+    MAILINGS = 'mailings'
+    ACTIVE_MAILINGS = 'active_mailings'
+    CLIENTS = 'clients'
+    NAMES = (
+        (MAILINGS, 'рассылки'),
+        (ACTIVE_MAILINGS, 'активные рассылки'),
+        (CLIENTS, 'клиенты'),
+    )
+    name = models.CharField(max_length=50, choices=NAMES, unique=True, verbose_name='счетчик')
+    value = models.IntegerField(default=0, verbose_name='значение')
+
+    def __str__(self):
+        return f"{self.get_name_display()}: {self.value}"
+
+    class Meta:
+        verbose_name = "Счетчик главной страницы"
+        verbose_name_plural = "Счетчики главной страницы"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Модель: корзина токенов ограничения скорости отправки, общая для всех процессов отправки (см. RateLimiter).
+    """
+
+    key = models.CharField(max_length=300, unique=True, verbose_name='корзина')
+    tokens = models.FloatField(verbose_name='кол-во токенов')
+    updated = models.FloatField(verbose_name='время пополнения (unix time)')
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f}"
+
+    class Meta:
+        verbose_name = "Корзина ограничения скорости"
+        verbose_name_plural = "Корзины ограничения скорости"
@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+    Страница постраничного вывода по ключу (keyset): вместо номера страницы ссылки содержат курсор —
+    значения ключа сортировки крайней строки, поэтому страница стоит одинаково при любом кол-ве строк.
+    """
+
+    def __init__(self, object_list: list, field: str, has_next: bool, has_previous: bool):
+        self.object_list = object_list
+        self.field = field
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+
+    def _cursor(self, obj) -> str:
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    @property
+    def next_cursor(self) -> str:
+        return self._cursor(self.object_list[-1]) if self.has_next else ''
+
+    @property
+    def previous_cursor(self) -> str:
+        return self._cursor(self.object_list[0]) if self.has_previous else ''
+
+
+def encode_cursor(value: datetime, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{value.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Возвращает пару (значение поля, id) из курсора или None, если курсор поврежден.
+    """
+
+    try:
+        value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_keyset(queryset, field: str, per_page: int, after: str = None, before: str = None) -> KeysetPage:
+    """
+    Возвращает страницу queryset, отсортированного по (field, id) от новых к старым.
+    after — курсор для следующей (более старой) страницы, before — для предыдущей.
+    Условие field <= значение курсора дублирует сравнение пары, чтобы БД сканировала индекс по диапазону.
+    """
+
+    after, before = after and decode_cursor(after), before and decode_cursor(before)
+    if before:
+        value, pk = before
+        rows = list(
+            queryset.filter(**{f'{field}__gte': value})
+            .filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+            .order_by(field, 'pk')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], field, has_next=True, has_previous=has_previous)
+
+    if after:
+        value, pk = after
+        queryset = queryset.filter(**{f'{field}__lte': value}).filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+        )
+    rows = list(queryset.order_by(f'-{field}', '-pk')[:per_page + 1])
+    return KeysetPage(rows[:per_page], field, has_next=len(rows) > per_page, has_previous=bool(after))
@@ -1,30 +1,70 @@
+import base64
+import hashlib
+import heapq
+import logging
+import os
+import random
+import re
 import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from collections import Counter, OrderedDict, deque, namedtuple
 from datetime import datetime, timedelta
+from email.header import Header
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.message import sanitize_address
+from django.core.mail.utils import DNS_NAME
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Q, F, Count, Min, Max, OuterRef, Exists, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
+from django.utils import timezone
+from django.utils.encoding import force_str
 
-from mailingapp.models import Mailing, Attempt
+from mailingapp.models import Client, Mailing, Message, Attempt, Delivery, DeliveryError, MailingClaim, \
+    DispatcherLease, OutboxMessage, Suppression, CircuitBreakerState, AttemptRollup, \
+    AttemptSummary, SiteCounter, RateLimitBucket
 
 
-def change_mailing_status():
+logger = logging.getLogger(__name__)
+
+SendResult = namedtuple('SendResult', ['status', 'response', 'smtp_code', 'refused'])
+
+
+def change_mailing_status() -> dict:
     """
     Меняет статус рассылки.
+    Переводы "создана" -> "запущена" и "запущена" -> "завершена" выполняются одним UPDATE каждый.
+    Возвращает кол-во рассылок, у которых изменился статус.
     """
 
     zone = pytz.timezone(settings.TIME_ZONE)
     current_datetime = datetime.now(zone)
-    mailings = Mailing.objects.exclude(status_mailing='completed').exclude(is_disabled=True)
+    mailings = Mailing.objects.exclude(is_disabled=True)
+
+    completed_count = mailings.filter(
+        status_mailing__in=('created', 'launched'),
+        end_mailing__lt=current_datetime,
+    ).update(status_mailing='completed')
+    launched_count = mailings.filter(
+        status_mailing='created',
+        start_mailing__lte=current_datetime,
+    ).update(status_mailing='launched')
 
-    for mailing in mailings:
-        if mailing.end_mailing < current_datetime:
-            mailing.status_mailing = 'completed'
-            mailing.save(update_fields=['status_mailing'])
-        if mailing.status_mailing == 'created' and mailing.start_mailing <= current_datetime:
-            mailing.status_mailing = 'launched'
-            mailing.save(update_fields=['status_mailing'])
+    if completed_count or launched_count:
+        logger.info("Mailings launched: %s, completed: %s.", launched_count, completed_count)
+        refresh_site_counters([SiteCounter.ACTIVE_MAILINGS])
+
+    return {'launched': launched_count, 'completed': completed_count}
 
 
 def is_next_send_time(mailing: Mailing, attempt: Attempt, current: datetime) -> bool:
@@ -32,18 +72,1131 @@ def is_next_send_time(mailing: Mailing, attempt: Attempt, current: datetime) ->
     Проверяет следующее время рассылки.
     """
 
-    time_difference = current - attempt.last_attempt if attempt else 0
     if attempt:
-        if mailing.periodic_mailing == 'once a day' and time_difference >= timedelta(days=1):
-            return True
-        elif mailing.periodic_mailing == 'once a week' and time_difference >= timedelta(days=7):
-            return True
-        elif mailing.periodic_mailing == 'once a month' and time_difference >= timedelta(days=30):
-            return True
+        period = Mailing.PERIOD_DELTAS.get(mailing.periodic_mailing)
+        return period is not None and current - attempt.last_attempt >= period
+
+    return True
+
+
+def get_pending_clients(mailing: Mailing, slot: datetime):
+    """
+    Возвращает клиентов рассылки, которым еще нужно отправить письмо за период slot.
+    Клиенты, которым письмо уже отправлено или адрес которых окончательно отклонен сервером (код 5xx), исключаются.
+    """
+
+    finished = Delivery.objects.filter(mailing=mailing, slot=slot).filter(
+        Q(status=Delivery.STATUS_SENT) | Q(smtp_code__gte=500)
+    )
+    return mailing.clients.exclude(pk__in=finished.values('client_id'))
+
+
+def get_due_mailings(current: datetime):
+    """
+    Возвращает запущенные рассылки, время отправки которых наступило.
+    Рассылки без рассчитанного времени отправки (созданные до его появления) тоже попадают в выборку.
+    Новые отправки идут раньше повторных.
+    """
+
+    return Mailing.objects.filter(status_mailing='launched').filter(
+        Q(next_send_at__lte=current) | Q(next_send_at__isnull=True)
+    ).select_related('message').order_by('retry_count', 'next_send_at')
+
+
+def get_retry_delay(retry_count: int) -> float:
+    """
+    Возвращает задержку повторной попытки в секундах: экспоненциальная задержка со случайным разбросом.
+    """
+
+    delay = min(settings.MAILING_RETRY_BASE_DELAY * 2 ** retry_count, settings.MAILING_RETRY_MAX_DELAY)
+    return random.uniform(delay / 2, delay)
+
+
+def get_retry_time(mailing: Mailing, current: datetime):
+    """
+    Возвращает время следующей повторной попытки: экспоненциальная задержка со случайным разбросом.
+    Возвращает None, если попытки исчерпаны или повтор наступил бы позже следующей плановой отправки.
+    """
+
+    if mailing.retry_count >= settings.MAILING_RETRY_MAX_ATTEMPTS:
+        return None
+
+    retry_time = current + timedelta(seconds=get_retry_delay(mailing.retry_count))
+    next_send_at = mailing.get_next_send_at(mailing.current_slot or current)
+    if next_send_at is not None and retry_time >= next_send_at:
+        return None
+
+    return retry_time
+
+
+def record_attempt(mailing: Mailing, status: str, response: str, current: datetime, slot: datetime = None,
+                   retry: bool = False, deferred: bool = False) -> Attempt:
+    """
+    Сохраняет попытку рассылки и переносит время следующей отправки.
+    """
+
+    attempt = Attempt.objects.create(
+        status_attempt=status,
+        answer_mail_server=response,
+        mailing=mailing,
+        last_attempt=current,
+    )
+    reschedule_mailing(mailing, slot or current, current, retry=retry, deferred=deferred)
+
+    return attempt
+
+
+def reschedule_mailing(mailing: Mailing, slot: datetime, current: datetime, retry: bool = False,
+                       deferred: bool = False):
+    """
+    Назначает следующую отправку рассылки после прохода по периоду slot.
+    При retry=True отправка периода ставится в очередь повторов, при deferred=True (часть писем
+    отложена ограничением скорости) остается в выборке следующего прохода, иначе следующая отправка
+    назначается через период рассылки после slot.
+    """
+
+    mailing.current_slot = slot
+    retry_time = get_retry_time(mailing, current) if retry else None
+    if retry_time is not None:
+        mailing.retry_count += 1
+        mailing.next_send_at = retry_time
+    elif deferred:
+        mailing.next_send_at = current
     else:
+        if retry:
+            logger.warning("Mailing %s: retries for slot %s exhausted.", mailing.pk, slot)
+        mailing.current_slot = None
+        mailing.retry_count = 0
+        mailing.next_send_at = mailing.get_next_send_at(slot, current)
+
+    with transaction.atomic():
+        Mailing.objects.filter(pk=mailing.pk).update(
+            next_send_at=mailing.next_send_at,
+            current_slot=mailing.current_slot,
+            retry_count=mailing.retry_count,
+        )
+        if mailing.current_slot is None:
+            MailingClaim.objects.filter(mailing=mailing, slot=slot).update(completed_at=current, lease_expires_at=None)
+
+
+def get_attempt_stats_key(mailing_id: int) -> str:
+    return f"mailing_attempt_stats:{mailing_id}"
+
+
+def is_attempt_stats_cache_enabled() -> bool:
+    """
+    Проверяет, что статистику попыток можно кэшировать: кэш включен (CACHE_ENABLED) и общий для процессов.
+    Попытки записывает процесс диспетчера, а статистику показывает веб-процесс, поэтому сброс кэша
+    в памяти одного процесса (LocMemCache) до другого не дойдет.
+    """
+
+    return settings.CACHE_ENABLED and not isinstance(caches['default'], LocMemCache)
+
+
+def get_attempt_stats(mailing: Mailing) -> dict:
+    """
+    Возвращает статистику попыток рассылки: кол-во попыток, долю успешных (в процентах), время последней
+    успешной и последней неуспешной попытки и гистограмму по дням с попытками за последние
+    MAILING_STATS_HISTOGRAM_DAYS дней. Итоги считаются одним aggregate(), гистограмма — запросом с группировкой
+    по дням только за эти дни, поэтому объем чтения не растет с длиной истории рассылки. При общем кэше
+    статистика кэшируется до появления новой попытки (см. invalidate_attempt_stats). Попытки, перенесенные
+    в архив, учитываются по AttemptSummary.
+    """
+
+    cache_enabled = is_attempt_stats_cache_enabled()
+    key = get_attempt_stats_key(mailing.pk)
+    stats = cache.get(key) if cache_enabled else None
+    if stats is not None:
+        return stats
+
+    successful = Q(status_attempt='Successfully')
+    attempts = Attempt.objects.filter(mailing=mailing)
+    totals = attempts.aggregate(
+        total=Count('pk'),
+        successful=Count('pk', filter=successful),
+        last_success=Max('last_attempt', filter=successful),
+        last_failure=Max('last_attempt', filter=~successful),
+    )
+    histogram_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(
+        days=settings.MAILING_STATS_HISTOGRAM_DAYS - 1,
+    )
+    days = (
+        attempts.filter(last_attempt__gte=histogram_start)
+        .annotate(day=TruncDate('last_attempt'))
+        .values('day')
+        .annotate(total=Count('pk'), successful=Count('pk', filter=successful))
+        .order_by('day')
+    )
+    summary = AttemptSummary.objects.filter(mailing=mailing).first()
+    archived = [summary] if summary else []
+    total = totals['total'] + sum(s.successful_count + s.failed_count for s in archived)
+    successful_count = totals['successful'] + sum(s.successful_count for s in archived)
+    last_success = [totals['last_success']] + [s.last_success for s in archived]
+    last_failure = [totals['last_failure']] + [s.last_failure for s in archived]
+    stats = {
+        'total': total,
+        'successful': successful_count,
+        'success_rate': round(successful_count * 100 / total, 1) if total else None,
+        'last_success': max(filter(None, last_success), default=None),
+        'last_failure': max(filter(None, last_failure), default=None),
+        'days': [
+            {
+                'day': day['day'],
+                'total': day['total'],
+                'successful': day['successful'],
+                'success_rate': round(day['successful'] * 100 / day['total']),
+            }
+            for day in days
+        ],
+    }
+    if cache_enabled:
+        cache.set(key, stats, settings.MAILING_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_attempt_stats(mailing_ids: list):
+    """
+    Сбрасывает кэш статистики попыток рассылок после сохранения новых попыток.
+    """
+
+    if not is_attempt_stats_cache_enabled():
+        return
+    cache.delete_many([get_attempt_stats_key(mailing_id) for mailing_id in set(mailing_ids) if mailing_id])
+
+
+def add_attempts_to_rollups(attempts: list):
+    """
+    Добавляет новые попытки к дневным итогам рассылок (AttemptRollup): по одному UPDATE со сдвигом
+    счетчиков на каждую пару (дата, рассылка), строка итогов создается при первой попытке за день.
+    """
+
+    counts = {}
+    for attempt in attempts:
+        if attempt.mailing_id is None:
+            continue
+        key = (timezone.localdate(attempt.last_attempt), attempt.mailing_id)
+        successful, failed = counts.get(key, (0, 0))
+        if attempt.status_attempt == 'Successfully':
+            successful += 1
+        else:
+            failed += 1
+        counts[key] = (successful, failed)
+    if not counts:
+        return
+
+    if all(Attempt.mailing.is_cached(attempt) for attempt in attempts if attempt.mailing_id):
+        users = {attempt.mailing_id: attempt.mailing.user_id for attempt in attempts if attempt.mailing_id}
+    else:
+        users = dict(Mailing.objects.filter(pk__in={key[1] for key in counts}).values_list('pk', 'user_id'))
+
+    for (date, mailing_id), (successful, failed) in counts.items():
+        rollup = AttemptRollup.objects.filter(date=date, mailing_id=mailing_id)
+        increments = {
+            'successful_count': F('successful_count') + successful,
+            'failed_count': F('failed_count') + failed,
+        }
+        if rollup.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                AttemptRollup.objects.create(
+                    date=date,
+                    mailing_id=mailing_id,
+                    user_id=users.get(mailing_id),
+                    successful_count=successful,
+                    failed_count=failed,
+                )
+        except IntegrityError:  # строку за этот день только что создал другой процесс
+            rollup.update(**increments)
+
+
+def count_site_counters(names: list) -> dict:
+    """
+    Считает значения счетчиков главной страницы names по таблицам.
+    """
+
+    querysets = {
+        SiteCounter.MAILINGS: Mailing.objects.all(),
+        SiteCounter.ACTIVE_MAILINGS: Mailing.objects.filter(status_mailing='launched', is_disabled=False),
+        SiteCounter.CLIENTS: Client.objects.all(),
+    }
+    return {name: querysets[name].count() for name in names}
+
+
+def refresh_site_counters(names: list = None) -> dict:
+    """
+    Пересчитывает счетчики главной страницы names (по умолчанию все) и сохраняет их одним запросом.
+    Кол-во активных рассылок меняется массовыми UPDATE статуса, поэтому оно пересчитывается после них целиком,
+    а кол-ва рассылок и клиентов сдвигаются при создании и удалении строк (см. add_to_site_counter).
+    """
+
+    counters = count_site_counters(names or [name for name, _ in SiteCounter.NAMES])
+    SiteCounter.objects.bulk_create(
+        [SiteCounter(name=name, value=value) for name, value in counters.items()],
+        update_conflicts=True,
+        unique_fields=['name'],
+        update_fields=['value'],
+    )
+    return counters
+
+
+def add_to_site_counter(name: str, delta: int):
+    """
+    Сдвигает счетчик главной страницы на delta. Пока счетчики не посчитаны, ничего не делает:
+    их посчитает get_site_counters при первом обращении.
+    """
+
+    SiteCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def get_site_counters() -> dict:
+    """
+    Возвращает счетчики главной страницы одним запросом. При первом обращении считает их по таблицам.
+    """
+
+    counters = dict(SiteCounter.objects.values_list('name', 'value'))
+    if len(counters) < len(SiteCounter.NAMES):
+        counters = refresh_site_counters()
+    return counters
+
+
+def get_worker_id() -> str:
+    """
+    Возвращает имя текущего процесса-отправителя.
+    """
+
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_due_mailings(worker: str, current: datetime, limit: int) -> list:
+    """
+    Захватывает до limit рассылок, время отправки которых наступило и которые не захвачены другим процессом.
+    Строки рассылок блокируются через select_for_update(skip_locked=True), если БД это поддерживает,
+    поэтому параллельные процессы разбирают разные рассылки. Период отправки — запланированное время отправки
+    (next_send_at), а не время захвата, чтобы опоздание прохода не сдвигало расписание; он запоминается в
+    Mailing.current_slot, а захват — в MailingClaim с уникальной парой (рассылка, период):
+    если процесс упал, после окончания захвата период дозабирает другой процесс.
+    Срок захвата отсчитывается от момента захвата, а не от начала прохода current, и продлевается,
+    пока рассылка отправляется (см. renew_claims).
+    """
+
+    now = timezone.now()
+    lease_expires_at = now + timedelta(seconds=settings.MAILING_CLAIM_LEASE_SECONDS)
+    live_claims = MailingClaim.objects.filter(
+        mailing=OuterRef('pk'),
+        completed_at__isnull=True,
+        lease_expires_at__gt=now,
+    )
+    features = connection.features
+    due_mailings = get_due_mailings(current)
+
+    with transaction.atomic():
+        mailings = list(
+            due_mailings.exclude(Exists(live_claims)).select_for_update(
+                skip_locked=features.has_select_for_update_skip_locked,
+                of=('self',) if features.has_select_for_update_of else (),
+            )[:limit]
+        )
+        if not mailings:
+            return []
+
+        for mailing in mailings:
+            mailing.current_slot = mailing.current_slot or mailing.next_send_at or current
+        Mailing.objects.bulk_update(mailings, ['current_slot'])
+        MailingClaim.objects.bulk_create(
+            [
+                MailingClaim(mailing=mailing, slot=mailing.current_slot, worker=worker,
+                             lease_expires_at=lease_expires_at)
+                for mailing in mailings
+            ],
+            update_conflicts=True,
+            unique_fields=['mailing', 'slot'],
+            update_fields=['worker', 'lease_expires_at'],
+        )
+
+    return mailings
+
+
+def renew_claims(worker: str) -> int:
+    """
+    Продлевает действующие незавершенные захваты процесса на MAILING_CLAIM_LEASE_SECONDS от текущего момента,
+    чтобы долгую отправку рассылки не забрал другой процесс. Возвращает кол-во продленных захватов.
+    """
+
+    now = timezone.now()
+    return MailingClaim.objects.filter(
+        worker=worker,
+        completed_at__isnull=True,
+        lease_expires_at__gt=now,
+    ).update(lease_expires_at=now + timedelta(seconds=settings.MAILING_CLAIM_LEASE_SECONDS))
+
+
+def release_claims(worker: str) -> int:
+    """
+    Снимает незавершенные захваты процесса, чтобы отложенные и повторные отправки мог забрать любой процесс.
+    """
+
+    now = timezone.now()
+    return MailingClaim.objects.filter(
+        worker=worker,
+        completed_at__isnull=True,
+        lease_expires_at__gt=now,
+    ).update(lease_expires_at=now)
+
+
+def get_retry_queue_stats(current: datetime) -> dict:
+    """
+    Возвращает размер очереди повторных отправок и возраст самой старой отправки в ней (в секундах).
+    """
+
+    stats = Mailing.objects.filter(retry_count__gt=0).aggregate(depth=Count('pk'), oldest_slot=Min('current_slot'))
+    oldest_slot = stats['oldest_slot']
+    return {
+        'depth': stats['depth'],
+        'oldest_age': (current - oldest_slot).total_seconds() if oldest_slot else 0,
+    }
+
+
+def is_server_failure(result: SendResult) -> bool:
+    """
+    Проверяет, что письмо не отправлено из-за сбоя почтового сервера (недоступен, обрыв связи, код 4xx),
+    а не из-за отказа по конкретным адресам или содержимому письма.
+    """
+
+    if result.status == 'Successfully' or result.refused:
+        return False
+    return result.smtp_code is None or 400 <= result.smtp_code < 500
+
+
+def is_transient_failure(result: SendResult) -> bool:
+    """
+    Проверяет, что пакет не отправлен из-за временной ошибки (код 4xx или обрыв связи),
+    а не потому, что сервер окончательно отклонил адреса.
+    """
+
+    if result.status == 'Successfully':
+        return False
+    if result.refused:
+        return any(code < 500 for code, _ in result.refused.values())
+    return result.smtp_code is None or result.smtp_code < 500
+
+
+class DispatchConnection:
+    """
+    Соединение с почтовым сервером на один проход рассылки.
+    Открывается при первой отправке и переиспользуется для всех писем прохода,
+    при обрыве переподключается. Считает, сколько писем ушло через каждое соединение.
+    """
+
+    def __init__(self, name: str = 'default'):
+        self.name = name
+        self.backend = get_connection(fail_silently=False)
+        self.sent_counts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        if self.backend.open() or not self.sent_counts:  # open() возвращает True, если соединение открыто заново
+            self.sent_counts.append(0)
+
+    def _sendmail(self, email_message: EmailMessage) -> dict:
+        smtp = getattr(self.backend, 'connection', None)
+        if smtp is None:  # бэкенды без SMTP (locmem, console) отказов по адресам не возвращают
+            self.backend.send_messages([email_message])
+            return {}
+
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        recipients = {sanitize_address(address, encoding): address for address in email_message.recipients()}
+        refused = smtp.sendmail(
+            sanitize_address(email_message.from_email, encoding),
+            list(recipients),
+            email_message.message().as_bytes(linesep='\r\n'),
+        )
+        return {recipients.get(address, address): answer for address, answer in refused.items()}
+
+    def send(self, email_message: EmailMessage) -> dict:
+        """
+        Отправляет письмо через открытое соединение.
+        Если сервер разорвал соединение, открывает новое и повторяет отправку один раз.
+        Возвращает адреса, отклоненные сервером: {адрес: (код, ответ)}.
+        """
+
+        self._open()
+        try:
+            refused = self._sendmail(email_message)
+        except smtplib.SMTPServerDisconnected:
+            logger.warning("Connection %s: server disconnected, reconnecting.", self.name)
+            self.backend.close()
+            self._open()
+            refused = self._sendmail(email_message)
+
+        self.sent_counts[-1] += 1
+        return refused
+
+    def close(self):
+        """
+        Закрывает соединение и пишет в лог статистику по отправленным письмам.
+        """
+
+        self.backend.close()
+        if self.sent_counts:
+            logger.info(
+                "Connection %s: %s connection(s), messages per connection: %s.",
+                self.name, len(self.sent_counts), self.sent_counts,
+            )
+
+
+class Dispatcher:
+    """
+    Отправляет письма рассылок.
+    При workers > 1 письма уходят из пула потоков, у каждого потока свое соединение с почтовым сервером,
+    а кол-во одновременно отправляемых писем ограничено max_in_flight.
+    Результаты отправки передаются в on_result в вызывающем потоке, поэтому работа с ORM остается в нем.
+    """
+
+    def __init__(self, on_result, workers: int = 1, max_in_flight: int = 1):
+        self.on_result = on_result
+        self.workers = workers
+        self.max_in_flight = max(max_in_flight, 1)
+        self.in_flight = {}
+        self.connections = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mailing') if workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_connection(self) -> DispatchConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = DispatchConnection(name=threading.current_thread().name)
+            self._local.connection = connection
+            with self._lock:
+                self.connections.append(connection)
+        return connection
+
+    def _send(self, email_message: EmailMessage) -> SendResult:
+        try:
+            refused = self._get_connection().send(email_message)
+        except smtplib.SMTPRecipientsRefused as e:
+            return SendResult('Not successful', 'Все адреса пакета отклонены сервером', None, e.recipients)
+        except smtplib.SMTPException as e:
+            return SendResult('Not successful', str(e), getattr(e, 'smtp_code', None), {})
+        except OSError as e:  # сервер недоступен: отказ в соединении, таймаут, ошибка DNS
+            return SendResult('Not successful', str(e), None, {})
+        return SendResult('Successfully', '', None, refused)
+
+    def _collect(self, return_when=FIRST_COMPLETED):
+        done, _ = wait(self.in_flight, return_when=return_when)
+        for future in done:
+            self.on_result(self.in_flight.pop(future), future.result())
+
+    def submit(self, key, email_message: EmailMessage):
+        """
+        Ставит письмо в отправку. Если достигнут лимит одновременных отправок, ждет завершения одной из них.
+        """
+
+        if self.executor is None:
+            self.on_result(key, self._send(email_message))
+            return
+
+        while len(self.in_flight) >= self.max_in_flight:
+            self._collect()
+        self.in_flight[self.executor.submit(self._send, email_message)] = key
+
+    def close(self):
+        """
+        Дожидается всех отправок и закрывает соединения.
+        """
+
+        try:
+            if self.in_flight:
+                self._collect(return_when=ALL_COMPLETED)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+            for connection in self.connections:
+                connection.close()
+
+
+class RateLimiter:
+    """
+    Ограничивает скорость отправки: одно письмо расходует токен корзины учетной записи отправителя
+    и по токену на каждого получателя в корзине его домена. Корзина пополняется со скоростью rate токенов
+    в секунду и вмещает не больше burst токенов.
+    Корзины хранятся в БД (RateLimitBucket) и общие для всех процессов отправки, поэтому лимит действует
+    на все диспетчеры вместе. Корзина пополняется и списывается одним условным UPDATE, только если токенов хватает.
+    Лимит 0 отключает соответствующее ограничение и запросы к БД.
+    """
+
+    def __init__(self, account_rate: float, account_burst: int, domain_rate: float, domain_burst: int):
+        self.account_rate = account_rate
+        self.account_burst = max(account_burst, 1)
+        self.domain_rate = domain_rate
+        self.domain_burst = max(domain_burst, 1)
+        self.created = set()
+
+    def _get_bucket(self, key: str, rate: float, burst: int):
+        if not rate:
+            return None
+        return key, rate, burst
+
+    def _get_account_bucket(self, account: str):
+        return self._get_bucket(f'account:{account}', self.account_rate, self.account_burst)
+
+    def _get_domain_bucket(self, domain: str):
+        return self._get_bucket(f'domain:{domain}', self.domain_rate, self.domain_burst)
+
+    def _create(self, buckets: list):
+        """
+        Создает недостающие строки корзин с полным запасом токенов.
+        """
+
+        missing = [(key, burst) for key, _, burst in buckets if key not in self.created]
+        if missing:
+            RateLimitBucket.objects.bulk_create(
+                [RateLimitBucket(key=key, tokens=burst, updated=time.time()) for key, burst in missing],
+                ignore_conflicts=True,
+            )
+            self.created.update(key for key, _ in missing)
+
+    def account_exhausted(self, account: str) -> bool:
+        bucket = self._get_account_bucket(account)
+        if bucket is None:
+            return False
+        key, rate, burst = bucket
+        row = RateLimitBucket.objects.filter(key=key).values_list('tokens', 'updated').first()
+        if row is None:
+            return False
+        tokens, updated = row
+        return min(burst, tokens + max(time.time() - updated, 0) * rate) < 1
+
+    def acquire(self, account: str, recipients: list, messages: int = 1) -> bool:
+        """
+        Расходует токены на отправку messages писем получателям recipients.
+        Возвращает False и ничего не расходует, если в какой-либо из корзин не хватает токенов.
+        """
+
+        requests = [(self._get_account_bucket(account), messages)]
+        domain_counts = Counter(email.rsplit('@', 1)[-1].lower() for email in recipients)
+        for domain, count in domain_counts.items():
+            requests.append((self._get_domain_bucket(domain), count))
+
+        # строки корзин блокируются в одном порядке, чтобы параллельные процессы не ждали друг друга по кругу
+        requests = sorted((bucket, amount) for bucket, amount in requests if bucket is not None)
+        if not requests:
+            return True
+        self._create([bucket for bucket, _ in requests])
+
+        now = time.time()
+        with transaction.atomic():
+            for (key, rate, burst), amount in requests:
+                amount = min(amount, burst)
+                refilled = Least(
+                    Value(float(burst)),
+                    F('tokens') + Greatest(Value(now) - F('updated'), Value(0.0)) * Value(rate),
+                )
+                if not RateLimitBucket.objects.filter(key=key).alias(refilled=refilled).filter(
+                        refilled__gte=amount).update(tokens=refilled - amount, updated=now):
+                    self.created.discard(key)  # строку могли удалить: при следующем вызове она создастся заново
+                    transaction.set_rollback(True)
+                    return False
         return True
 
-    return False
+    def throttle(self, account: str):
+        """
+        Опустошает корзину учетной записи, если сервер ответил, что лимит превышен.
+        """
+
+        bucket = self._get_account_bucket(account)
+        if bucket is not None:
+            self._create([bucket])
+            RateLimitBucket.objects.filter(key=bucket[0]).update(tokens=0, updated=time.time())
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Возвращает ограничитель скорости процесса. Корзины хранятся в БД и переживают проход, поэтому отложенные
+    письма уходят в следующих проходах по мере пополнения токенов.
+    """
+
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            account_rate=settings.MAILING_ACCOUNT_RATE_PER_MINUTE / 60,
+            account_burst=settings.MAILING_ACCOUNT_BURST,
+            domain_rate=settings.MAILING_DOMAIN_RATE_PER_MINUTE / 60,
+            domain_burst=settings.MAILING_DOMAIN_BURST,
+        )
+    return _rate_limiter
+
+
+class SuppressionList:
+    """
+    Стоп-лист в памяти процесса: множество адресов для проверки получателей за O(1) без запросов к БД.
+    refresh догружает только записи, добавленные с прошлого обновления (по id); если записи удалялись,
+    стоп-лист загружается заново.
+    """
+
+    def __init__(self):
+        self.emails = set()
+        self.last_id = 0
+        self.count = 0
+
+    def refresh(self) -> set:
+        stats = Suppression.objects.aggregate(count=Count('pk'), last_id=Max('pk'))
+        last_id = stats['last_id'] or 0
+        if last_id > self.last_id:
+            for email in Suppression.objects.filter(pk__gt=self.last_id, pk__lte=last_id).values_list(
+                    'email', flat=True).iterator():
+                self.emails.add(email)
+                self.count += 1
+            self.last_id = last_id
+
+        if self.count != stats['count']:
+            self.emails = set(Suppression.objects.filter(pk__lte=last_id).values_list('email', flat=True).iterator())
+            self.count = len(self.emails)
+            self.last_id = last_id
+
+        return self.emails
+
+
+_suppression_list = SuppressionList()
+
+
+def get_suppressed_emails() -> set:
+    """
+    Возвращает обновленный стоп-лист процесса.
+    """
+
+    return _suppression_list.refresh()
+
+
+class CircuitBreaker:
+    """
+    Предохранитель отправки писем.
+    В замкнутом состоянии письма отправляются, а результаты последних window отправок запоминаются.
+    Если доля сбоев сервера среди них (не меньше min_requests отправок) достигла failure_rate, предохранитель
+    размыкается: open_seconds секунд письма откладываются без обращения к серверу. Затем одно пробное письмо
+    (полуразомкнутое состояние) либо замыкает предохранитель, либо размыкает его снова.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window: int, min_requests: int, failure_rate: float, open_seconds: float):
+        self.results = deque(maxlen=max(window, 1))
+        self.min_requests = max(min_requests, 1)
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.opened_monotonic = None
+        self.probe_in_flight = False
+        self.changed = False
+        self._lock = threading.Lock()
+
+    def get_failure_rate(self) -> float:
+        if not self.results:
+            return 0
+        return self.results.count(False) / len(self.results)
+
+    def _set_state(self, state: str):
+        self.state = state
+        self.changed = True
+        if state == self.OPEN:
+            self.opened_at = datetime.now(pytz.timezone(settings.TIME_ZONE))
+            self.opened_monotonic = time.monotonic()
+            logger.warning("Circuit breaker opened, failure rate %.2f.", self.get_failure_rate())
+        elif state == self.CLOSED:
+            self.results.clear()
+            self.opened_at = None
+            logger.info("Circuit breaker closed.")
+
+    def _cooling_down(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self.opened_monotonic < self.open_seconds
+
+    def is_blocked(self) -> bool:
+        """
+        Проверяет, что отправлять письма сейчас нельзя (не занимая пробную отправку).
+        """
+
+        with self._lock:
+            return self._cooling_down() or (self.state == self.HALF_OPEN and self.probe_in_flight)
+
+    def allow(self) -> bool:
+        """
+        Проверяет, можно ли отправить письмо. В полуразомкнутом состоянии разрешает одну пробную отправку.
+        """
+
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self._cooling_down():
+                return False
+            if self.state == self.OPEN:
+                self._set_state(self.HALF_OPEN)
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record(self, success: bool):
+        """
+        Учитывает результат отправки письма.
+        """
+
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.probe_in_flight:
+                self.probe_in_flight = False
+                self._set_state(self.CLOSED if success else self.OPEN)
+            elif self.state == self.CLOSED:
+                self.results.append(success)
+                if not success and len(self.results) >= self.min_requests \
+                        and self.get_failure_rate() >= self.failure_rate:
+                    self._set_state(self.OPEN)
+
+    def publish(self, worker: str):
+        """
+        Сохраняет изменившееся состояние предохранителя в CircuitBreakerState для мониторинга.
+        """
+
+        with self._lock:
+            if not self.changed:
+                return
+            self.changed = False
+            defaults = {'state': self.state, 'failure_rate': self.get_failure_rate(), 'opened_at': self.opened_at}
+        CircuitBreakerState.objects.update_or_create(worker=worker, defaults=defaults)
+
+
+_circuit_breaker = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    Возвращает предохранитель отправки процесса: его состояние переживает проход рассылки.
+    """
+
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(
+            window=settings.MAILING_BREAKER_WINDOW,
+            min_requests=settings.MAILING_BREAKER_MIN_REQUESTS,
+            failure_rate=settings.MAILING_BREAKER_FAILURE_RATE,
+            open_seconds=settings.MAILING_BREAKER_OPEN_SECONDS,
+        )
+    return _circuit_breaker
+
+
+class DeliveryLog:
+    """
+    Буфер записей о доставке писем клиентам.
+    Записи сохраняются через bulk_create пачками по batch_size, тексты ошибок хранятся один раз в DeliveryError.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.rows = []
+        self._error_ids = {}
+
+    def _get_error_id(self, text: str):
+        if not text:
+            return None
+        if text not in self._error_ids:
+            text_hash = hashlib.sha1(text.encode()).hexdigest()
+            error, _ = DeliveryError.objects.get_or_create(text_hash=text_hash, defaults={'text': text})
+            self._error_ids[text] = error.pk
+        return self._error_ids[text]
+
+    def add(self, mailing_id: int, client_id: int, slot: datetime, status: int, smtp_code=None, error=''):
+        self.rows.append(Delivery(
+            mailing_id=mailing_id,
+            client_id=client_id,
+            slot=slot,
+            status=status,
+            smtp_code=smtp_code,
+            error_id=self._get_error_id(error),
+        ))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Сохраняет накопленные записи. Повторная доставка в том же периоде обновляет существующую запись.
+        """
+
+        if self.rows:
+            Delivery.objects.bulk_create(
+                self.rows,
+                update_conflicts=True,
+                unique_fields=['mailing', 'slot', 'client'],
+                update_fields=['status', 'smtp_code', 'error'],
+            )
+            self.rows = []
+
+
+def iter_recipient_results(recipients: list, result: SendResult):
+    """
+    Возвращает результат отправки письма по каждому получателю:
+    кортежи (id клиента, адрес, статус доставки, код ответа сервера, текст ошибки).
+    """
+
+    for client_id, email, *_ in recipients:
+        if email in result.refused:
+            smtp_code, answer = result.refused[email]
+            yield client_id, email, Delivery.STATUS_REFUSED, smtp_code, force_str(answer)
+        elif result.status != 'Successfully':
+            yield client_id, email, Delivery.STATUS_FAILED, result.smtp_code, result.response
+        else:
+            yield client_id, email, Delivery.STATUS_SENT, None, ''
+
+
+def is_retryable(status: int, smtp_code: int) -> bool:
+    """
+    Проверяет, что адрес не получил письмо из-за временной ошибки и его можно отправить повторно.
+    """
+
+    return status != Delivery.STATUS_SENT and (smtp_code is None or smtp_code < 500)
+
+
+def describe_failure(label: str, domain: str, recipients: list, result: SendResult) -> str:
+    """
+    Возвращает описание ошибки отправки письма для ответа сервера в попытке рассылки.
+    """
+
+    if result.status != 'Successfully':
+        return f"{label} ({domain}, {len(recipients)} адресов): {result.response}"
+    if result.refused:
+        return f"{label} ({domain}): отклонено адресов: {len(result.refused)}"
+    return ''
+
+
+class MailingProgress:
+    """
+    Собирает результаты отправки пакетов одной рассылки и сохраняет попытку, когда отправлены все пакеты.
+    Если часть адресов не получила письмо из-за временной ошибки, отправка ставится в очередь повторов.
+    """
+
+    def __init__(self, mailing: Mailing, slot: datetime, current_datetime: datetime, delivery_log: DeliveryLog):
+        self.mailing = mailing
+        self.slot = slot
+        self.current_datetime = current_datetime
+        self.delivery_log = delivery_log
+        self.pending = 0
+        self.submitted = False
+        self.errors = []
+        self.retry = False
+        self.attempted = False
+        self.deferred_count = 0
+
+    def batch_submitted(self):
+        self.pending += 1
+        self.attempted = True
+
+    def batch_deferred(self, recipients: list):
+        self.deferred_count += len(recipients)
+
+    def batch_done(self, batch_number: int, domain: str, recipients: list, result: SendResult):
+        self.pending -= 1
+        for client_id, email, status, smtp_code, error in iter_recipient_results(recipients, result):
+            if is_retryable(status, smtp_code):
+                self.retry = True  # временная ошибка: адрес получит письмо при повторе
+            self.delivery_log.add(self.mailing.pk, client_id, self.slot, status, smtp_code, error)
+
+        error = describe_failure(f"Пакет {batch_number}", domain, recipients, result)
+        if error:
+            self.errors.append(error)
+        self._finish()
+
+    def all_submitted(self):
+        self.submitted = True
+        self._finish()
+
+    def _finish(self):
+        if not self.submitted or self.pending:
+            return
+
+        deferred = bool(self.deferred_count)
+        if not self.attempted:
+            reschedule_mailing(self.mailing, self.slot, self.current_datetime, deferred=deferred)
+            return
+
+        status = 'Not successful' if self.errors else 'Successfully'
+        response = self.errors + ([f"Отложено адресов: {self.deferred_count}"] if deferred else [])
+        # записи о доставке сохраняются вместе с попыткой: повтор периода без них ушел бы всем клиентам
+        with transaction.atomic():
+            self.delivery_log.flush()
+            record_attempt(
+                self.mailing, status, '\n'.join(response), self.current_datetime,
+                slot=self.slot, retry=self.retry, deferred=deferred,
+            )
+
+
+class MailingSender:
+    """
+    Один проход отправки рассылок.
+    Рассылки захватываются пачками по MAILING_CLAIM_BATCH_SIZE (см. claim_due_mailings), поэтому
+    несколько процессов могут отправлять одновременно без повторных писем.
+    Получатели каждой рассылки читаются из БД потоком и отправляются пакетами
+    по MAILING_RECIPIENTS_PER_MESSAGE адресов, ошибки учитываются по каждому пакету.
+    Повторная отправка периода уходит только клиентам, которые еще не получили письмо,
+    адреса из стоп-листа (Suppression) пропускаются.
+    Пакеты сверх лимита скорости откладываются на следующий проход, как и рассылки сверх
+    MAILING_MAX_SENDS_PER_TICK.
+    Пока разомкнут предохранитель (см. CircuitBreaker), рассылки не захватываются, а неотправленные
+    пакеты откладываются на следующий проход.
+    При MAILING_OUTBOX_ENABLED письма не отправляются, а записываются в исходящую очередь (см. spool).
+    """
+
+    def __init__(self):
+        zone = pytz.timezone(settings.TIME_ZONE)
+        self.current_datetime = datetime.now(zone)
+        self.worker = get_worker_id()
+        self.delivery_log = DeliveryLog(settings.MAILING_DELIVERY_LOG_BATCH_SIZE)
+        self.rate_limiter = get_rate_limiter()
+        self.account = settings.EMAIL_HOST_USER or ''
+        self.dispatcher = None
+        self.started_count = 0
+        self.failed_domains = set()
+        self.suppressed = get_suppressed_emails()
+        self.breaker = get_circuit_breaker()
+        self.renewed_at = time.monotonic()
+
+    def renew_claims(self):
+        """
+        Продлевает захваты процесса, если с прошлого продления прошла треть срока захвата.
+        Вызывается между пакетами писем и при получении результатов отправки.
+        """
+
+        if time.monotonic() - self.renewed_at >= settings.MAILING_CLAIM_LEASE_SECONDS / 3:
+            renew_claims(self.worker)
+            self.renewed_at = time.monotonic()
+
+    def on_result(self, key, result: SendResult):
+        self.renew_claims()
+        progress, batch_number, domain, recipients = key
+        self.breaker.record(not is_server_failure(result))
+        if result.smtp_code in (421, 451):
+            self.rate_limiter.throttle(self.account)
+        if is_transient_failure(result):
+            # остальные пакеты домена в этом проходе откладываются, другие домены отправляются
+            self.failed_domains.add(domain)
+        progress.batch_done(batch_number, domain, recipients, result)
+
+    def run(self):
+        try:
+            with Dispatcher(
+                    self.on_result,
+                    workers=settings.MAILING_DISPATCH_WORKERS,
+                    max_in_flight=settings.MAILING_DISPATCH_MAX_IN_FLIGHT,
+            ) as self.dispatcher:
+                while not self.rate_limiter.account_exhausted(self.account) and not self.is_blocked():
+                    limit = settings.MAILING_CLAIM_BATCH_SIZE
+                    if settings.MAILING_MAX_SENDS_PER_TICK:
+                        limit = min(limit, settings.MAILING_MAX_SENDS_PER_TICK - self.started_count)
+                    mailings = claim_due_mailings(
+                        self.worker, self.current_datetime, limit,
+                    ) if limit > 0 else []
+                    if not mailings:
+                        break
+                    for mailing in mailings:
+                        if self.rate_limiter.account_exhausted(self.account) or self.is_blocked():
+                            break  # оставшиеся рассылки попадут в выборку следующего прохода
+                        if settings.MAILING_OUTBOX_ENABLED:
+                            self.spool(mailing)
+                        else:
+                            self.send(mailing)
+            self.delivery_log.flush()
+        finally:
+            release_claims(self.worker)
+            self.breaker.publish(self.worker)
+
+        queue_stats = get_retry_queue_stats(self.current_datetime)
+        if queue_stats['depth']:
+            logger.info(
+                "Retry queue: %s mailing(s), oldest slot age %s s.",
+                queue_stats['depth'], int(queue_stats['oldest_age']),
+            )
+
+    def is_blocked(self) -> bool:
+        """
+        Проверяет, что отправка приостановлена предохранителем. Запись в исходящую очередь не приостанавливается.
+        """
+
+        return not settings.MAILING_OUTBOX_ENABLED and self.breaker.is_blocked()
+
+    def send(self, mailing: Mailing):
+        """
+        Отправляет захваченную рассылку за период mailing.current_slot.
+        """
+
+        if not is_mailing_due(mailing, self.current_datetime):
+            return
+
+        self.started_count += 1
+        slot = mailing.current_slot
+        progress = MailingProgress(mailing, slot, self.current_datetime, self.delivery_log)
+        batches = iter_recipient_batches(mailing, slot, settings.MAILING_RECIPIENTS_PER_MESSAGE, self.suppressed)
+        for batch_number, (domain, recipients) in enumerate(batches, start=1):
+            self.renew_claims()
+            email_messages = build_email_messages(mailing, recipients)
+            if domain in self.failed_domains or not self.rate_limiter.acquire(
+                    self.account, [recipient[1] for recipient in recipients], messages=len(email_messages)) \
+                    or not self.breaker.allow():
+                progress.batch_deferred(recipients)
+                if self.rate_limiter.account_exhausted(self.account) or self.breaker.is_blocked():
+                    break
+                continue
+
+            for message_recipients, email_message in email_messages:
+                progress.batch_submitted()
+                self.dispatcher.submit((progress, batch_number, domain, message_recipients), email_message)
+        progress.all_submitted()
+
+    def spool(self, mailing: Mailing):
+        """
+        Записывает письма захваченной рассылки за период mailing.current_slot в исходящую очередь
+        и назначает следующую отправку. Все это сохраняется одной транзакцией: после сбоя период
+        либо целиком стоит в очереди, либо будет записан в нее заново, но не дважды.
+        """
+
+        if not is_mailing_due(mailing, self.current_datetime):
+            return
+
+        self.started_count += 1
+        slot = mailing.current_slot
+        rows = []
+        with transaction.atomic():
+            batches = iter_recipient_batches(mailing, slot, settings.MAILING_RECIPIENTS_PER_MESSAGE, self.suppressed)
+            for domain, recipients in batches:
+                for message_recipients, email_message in build_email_messages(mailing, recipients):
+                    rows.append(OutboxMessage(
+                        mailing=mailing,
+                        slot=slot,
+                        domain=domain,
+                        recipients=[recipient[:2] for recipient in message_recipients],
+                        from_email=email_message.from_email,
+                        payload=email_message.message().as_bytes(),
+                        next_attempt_at=self.current_datetime,
+                    ))
+                if len(rows) >= settings.MAILING_DELIVERY_LOG_BATCH_SIZE:
+                    OutboxMessage.objects.bulk_create(rows)
+                    rows = []
+            OutboxMessage.objects.bulk_create(rows)
+            reschedule_mailing(mailing, slot, self.current_datetime)
+            notify_channel(OUTBOX_CHANNEL)
 
 
 def send_mailing():
@@ -51,36 +1204,563 @@ def send_mailing():
     Отправляет рассылку.
     """
 
-    zone = pytz.timezone(settings.TIME_ZONE)
-    current_datetime = datetime.now(zone)
-    mailings = Mailing.objects.filter(status_mailing='launched')
-
-    for mailing in mailings:
-        attempts = Attempt.objects.filter(mailing=mailing)
-        end_attempt = attempts.order_by('-last_attempt')[0] if attempts else None  # получаем последнюю попытку
-
-        if is_next_send_time(mailing, end_attempt, current_datetime):
-            response = ''
-            try:
-                send_mail(
-                    subject=mailing.message.message_title,
-                    message=mailing.message.message_text,
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[client.email_client for client in mailing.clients.all()],
-                    fail_silently=False,
-                )
-                status = 'Successfully'
+    MailingSender().run()
 
-            except smtplib.SMTPException as e:
-                status = 'Not successful'
-                response = str(e)
 
-            Attempt.objects.create(
-                status_attempt=status,
-                answer_mail_server=response,
-                mailing=mailing,
-                last_attempt=current_datetime,
+def send_mailing_now(mailing_id: int) -> bool:
+    """
+    Ставит рассылку в отправку немедленно, не дожидаясь ее времени отправки: созданная рассылка запускается,
+    время отправки переносится на текущий момент, а после коммита будится диспетчер (см. notify_dispatcher),
+    который захватывает и отправляет рассылку (или записывает ее в исходящую очередь) как обычно.
+    Сам процесс, вызвавший функцию (например, веб-сервер), писем не отправляет.
+    Возвращает False, если рассылка отключена, завершена или уже отправлена в текущем периоде —
+    повторно в том же периоде рассылка не отправляется (см. также claim_due_mailings).
+    """
+
+    current = datetime.now(pytz.timezone(settings.TIME_ZONE))
+    queued = Mailing.objects.filter(pk=mailing_id, end_mailing__gt=current).exclude(is_disabled=True).filter(
+        Q(status_mailing='created') | Q(status_mailing='launched', next_send_at__lte=current)
+    ).update(
+        status_mailing='launched',
+        next_send_at=Least(Coalesce('next_send_at', Value(current)), Value(current)),
+    )
+    if queued:
+        transaction.on_commit(notify_dispatcher)
+        transaction.on_commit(lambda: refresh_site_counters([SiteCounter.ACTIVE_MAILINGS]))
+    return bool(queued)
+
+
+def is_mailing_due(mailing: Mailing, current_datetime: datetime) -> bool:
+    """
+    Проверяет, что рассылку из выборки get_due_mailings пора отправлять.
+    Для рассылки без рассчитанного времени отправки проверяет последнюю попытку и запоминает результат.
+    """
+
+    if mailing.next_send_at is not None:
+        return True
+
+    end_attempt = Attempt.objects.filter(mailing=mailing).order_by('-last_attempt').first()
+    if is_next_send_time(mailing, end_attempt, current_datetime):
+        return True
+
+    next_send_at = mailing.get_next_send_at(end_attempt.last_attempt)
+    Mailing.objects.filter(pk=mailing.pk).update(next_send_at=next_send_at, current_slot=None)
+    return False
+
+
+def iter_recipient_batches(mailing: Mailing, slot: datetime, batch_size: int, suppressed: set = frozenset()):
+    """
+    Возвращает клиентов, ожидающих письма за период slot, сгруппированных по домену адреса:
+    пары (домен, пакет), где пакет — не больше batch_size строк одного домена с полями RECIPIENT_FIELDS.
+    Клиенты читаются из БД потоком, не загружаясь в память целиком. Адреса из стоп-листа suppressed пропускаются.
+    """
+
+    clients = get_pending_clients(mailing, slot).order_by('email_domain', 'pk').values_list(
+        'email_domain', *RECIPIENT_FIELDS,
+    ).iterator(chunk_size=batch_size)
+
+    batch_domain, batch = None, []
+    for domain, *recipient in clients:
+        if recipient[1].lower() in suppressed:
+            continue
+        domain = domain or Client.get_email_domain(recipient[1])  # клиенты до backfillemaildomains
+        if batch and (domain != batch_domain or len(batch) >= batch_size):
+            yield batch_domain, batch
+            batch = []
+        batch_domain = domain
+        batch.append(tuple(recipient))
+    if batch:
+        yield batch_domain, batch
+
+
+class PreparedMIME:
+    """
+    Готовое MIME-сообщение в байтах с интерфейсом, который ждут почтовые бэкенды Django.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep='\n'):
+        return self.data
+
+    def as_string(self, unixfrom=False, linesep='\n'):
+        return self.data.decode('ascii', errors='replace')
+
+    def get_charset(self):
+        return None
+
+
+class PreparedEmailMessage(EmailMessage):
+    """
+    Письмо из заранее собранного MIME-сообщения рассылки (Message.mime_payload).
+    Для каждого конверта к байтам сообщения дописываются только заголовки From, To, Date и Message-ID.
+    """
+
+    def __init__(self, payload: bytes, from_email: str, to: list):
+        super().__init__(from_email=from_email, to=to)
+        self.payload = payload
+
+    def message(self):
+        encoding = self.encoding or settings.DEFAULT_CHARSET
+        headers = (
+            f"From: {sanitize_address(self.from_email, encoding)}\r\n"
+            f"To: {', '.join(sanitize_address(address, encoding) for address in self.to)}\r\n"
+            f"Date: {formatdate(localtime=settings.EMAIL_USE_LOCALTIME)}\r\n"
+            f"Message-ID: {make_msgid(domain=DNS_NAME)}\r\n"
+        )
+        return PreparedMIME(headers.encode('ascii') + self.payload)
+
+
+class SpooledEmailMessage(PreparedEmailMessage):
+    """
+    Письмо из исходящей очереди: MIME-сообщение сохранено целиком, вместе с заголовками конверта.
+    """
+
+    def message(self):
+        return PreparedMIME(self.payload)
+
+
+RECIPIENT_FIELDS = ('pk', 'email_client', 'first_name', 'last_name', 'middle_name')
+
+
+class MessageTemplate:
+    """
+    Скомпилированный шаблон сообщения для персонализации.
+    Текст разбирается один раз на куски текста и подстановки {{ поле }} полей клиента
+    (first_name, last_name, middle_name, email_client). Подстановка хранится как индекс в строке получателя
+    из RECIPIENT_FIELDS, поэтому отрисовка письма — это только склейка строк.
+    """
+
+    PLACEHOLDER = re.compile(r'{{\s*(first_name|last_name|middle_name|email_client)\s*}}')
+
+    def __init__(self, message: Message):
+        parts = self.PLACEHOLDER.split(message.message_text)
+        self.literals = parts[0::2]
+        self.indexes = [RECIPIENT_FIELDS.index(field) for field in parts[1::2]]
+        self.personalized = bool(self.indexes)
+
+        mime = MIMEText('', 'plain', 'utf-8')
+        mime['Subject'] = Header(message.message_title, 'utf-8')
+        headers = mime.as_bytes(policy=mime.policy.clone(linesep='\r\n')).split(b'\r\n\r\n', 1)[0]
+        self.headers = headers + b'\r\n\r\n'
+
+    def render_text(self, recipient: tuple) -> str:
+        literals = self.literals
+        chunks = [literals[0]]
+        for position, index in enumerate(self.indexes, start=1):
+            chunks.append(recipient[index] or '')
+            chunks.append(literals[position])
+        return ''.join(chunks)
+
+    def render_payload(self, recipient: tuple) -> bytes:
+        """
+        Возвращает MIME-сообщение для одного получателя (строки с полями RECIPIENT_FIELDS).
+        """
+
+        body = base64.encodebytes(self.render_text(recipient).encode('utf-8'))
+        return self.headers + body.replace(b'\n', b'\r\n')
+
+
+_message_cache = OrderedDict()
+
+
+def _get_cached(key: tuple, build):
+    """
+    LRU-кэш процесса для собранных сообщений и шаблонов (не больше MAILING_PAYLOAD_CACHE_SIZE записей).
+    """
+
+    value = _message_cache.get(key)
+    if value is None:
+        value = build()
+        _message_cache[key] = value
+        if len(_message_cache) > settings.MAILING_PAYLOAD_CACHE_SIZE:
+            _message_cache.popitem(last=False)
+    else:
+        _message_cache.move_to_end(key)
+    return value
+
+
+def get_message_template(message: Message) -> MessageTemplate:
+    """
+    Возвращает скомпилированный шаблон сообщения из кэша процесса по ключу (id, версия).
+    """
+
+    return _get_cached(('template', message.pk, message.version), lambda: MessageTemplate(message))
+
+
+def get_message_payload(message: Message) -> bytes:
+    """
+    Возвращает собранное MIME-сообщение из кэша процесса по ключу (id, версия).
+    Изменение сообщения увеличивает версию, поэтому устаревшая копия не будет отправлена.
+    """
+
+    def build():
+        if message.mime_payload is None:  # сообщение сохранено до появления поля
+            message.mime_payload = message.build_mime_payload()
+            Message.objects.filter(pk=message.pk, version=message.version).update(mime_payload=message.mime_payload)
+        return bytes(message.mime_payload)
+
+    return _get_cached(('payload', message.pk, message.version), build)
+
+
+def build_email_messages(mailing: Mailing, recipients: list) -> list:
+    """
+    Собирает письма рассылки для пакета получателей (строк с полями RECIPIENT_FIELDS).
+    Обычное сообщение отправляется одним письмом на весь пакет, персонализированное — письмом на получателя.
+    Возвращает список пар (получатели письма, письмо).
+    """
+
+    template = get_message_template(mailing.message)
+    if template.personalized:
+        return [
+            ([recipient], PreparedEmailMessage(
+                template.render_payload(recipient), settings.EMAIL_HOST_USER, [recipient[1]],
+            ))
+            for recipient in recipients
+        ]
+
+    payload = get_message_payload(mailing.message)
+    return [(recipients, PreparedEmailMessage(
+        payload, settings.EMAIL_HOST_USER, [recipient[1] for recipient in recipients],
+    ))]
+
+
+DISPATCHER_CHANNEL = 'mailing_dispatcher'
+OUTBOX_CHANNEL = 'mailing_outbox'
+
+
+def notify_channel(channel: str):
+    """
+    Будит процессы, ожидающие уведомлений канала channel (PostgreSQL NOTIFY, доставляется после коммита).
+    На других БД ничего не делает: процессы проверят очередь сами по таймауту.
+    """
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'NOTIFY {channel}')
+
+
+def notify_dispatcher():
+    """
+    Будит процессы rundispatcher после изменения рассылки.
+    Без уведомления диспетчер проверит рассылки не позже чем через MAILING_DISPATCHER_MAX_SLEEP.
+    """
+
+    notify_channel(DISPATCHER_CHANNEL)
+
+
+def claim_outbox_messages(worker: str, current: datetime, limit: int) -> list:
+    """
+    Захватывает до limit писем исходящей очереди, время отправки которых наступило.
+    Захват действует MAILING_CLAIM_LEASE_SECONDS: если процесс доставки упал, не подтвердив отправку,
+    письмо после окончания захвата отправит другой процесс. Срок захвата отсчитывается от момента захвата
+    и продлевается, пока процесс отправляет пачку (см. renew_outbox_messages).
+    """
+
+    now = timezone.now()
+    lease_expires_at = now + timedelta(seconds=settings.MAILING_CLAIM_LEASE_SECONDS)
+    features = connection.features
+
+    with transaction.atomic():
+        outbox_messages = list(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.STATUS_PENDING,
+                next_attempt_at__lte=current,
+            ).filter(
+                Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now)
+            ).order_by('next_attempt_at', 'pk').select_for_update(
+                skip_locked=features.has_select_for_update_skip_locked,
+            )[:limit]
+        )
+        OutboxMessage.objects.filter(pk__in=[outbox_message.pk for outbox_message in outbox_messages]).update(
+            worker=worker,
+            lease_expires_at=lease_expires_at,
+        )
+
+    return outbox_messages
+
+
+def renew_outbox_messages(worker: str) -> int:
+    """
+    Продлевает действующие захваты писем процесса на MAILING_CLAIM_LEASE_SECONDS от текущего момента,
+    чтобы письма долгой пачки не отправил повторно другой процесс. Возвращает кол-во продленных захватов.
+    """
+
+    now = timezone.now()
+    return OutboxMessage.objects.filter(
+        worker=worker,
+        status=OutboxMessage.STATUS_PENDING,
+        lease_expires_at__gt=now,
+    ).update(lease_expires_at=now + timedelta(seconds=settings.MAILING_CLAIM_LEASE_SECONDS))
+
+
+def release_outbox_messages(worker: str, pks: list) -> int:
+    """
+    Снимает захваты писем процесса, которые он не отправлял (например, отложенных ограничением скорости).
+    Захваты отправленных, но не подтвержденных писем остаются до окончания срока.
+    """
+
+    return OutboxMessage.objects.filter(
+        pk__in=pks,
+        worker=worker,
+        status=OutboxMessage.STATUS_PENDING,
+    ).update(lease_expires_at=None)
+
+
+def complete_outbox_slots(current: datetime) -> list:
+    """
+    Сохраняет попытки рассылок за периоды, все письма которых в очереди обработаны, и удаляет эти письма
+    из очереди. Периоды ищутся в БД, а не среди писем прохода, поэтому период, письма которого
+    подтверждены, но попытка не сохранена (процесс упал или проход прервался ошибкой), завершит следующий проход
+    любого процесса. Попытки сохраняются одним запросом.
+    """
+
+    pending = OutboxMessage.objects.filter(
+        mailing=OuterRef('mailing'),
+        slot=OuterRef('slot'),
+        status=OutboxMessage.STATUS_PENDING,
+    )
+    slots = set(
+        OutboxMessage.objects.exclude(status=OutboxMessage.STATUS_PENDING)
+        .exclude(Exists(pending))
+        .values_list('mailing_id', 'slot')
+    )
+
+    attempts = []
+    with transaction.atomic():
+        for mailing_id, slot in slots:
+            rows = list(
+                OutboxMessage.objects.filter(mailing_id=mailing_id, slot=slot)
+                .select_for_update().values_list('status', 'error')
+            )
+            if not rows or any(status == OutboxMessage.STATUS_PENDING for status, _ in rows):
+                continue  # период уже завершен другим процессом или еще доставляется
+
+            OutboxMessage.objects.filter(mailing_id=mailing_id, slot=slot).delete()
+            errors = [error for _, error in rows if error]
+            attempts.append(Attempt(
+                status_attempt='Not successful' if errors else 'Successfully',
+                answer_mail_server='\n'.join(errors),
+                mailing_id=mailing_id,
+                last_attempt=current,
+            ))
+        Attempt.objects.bulk_create(attempts)
+        add_attempts_to_rollups(attempts)
+        transaction.on_commit(lambda: invalidate_attempt_stats([attempt.mailing_id for attempt in attempts]))
+
+    return attempts
+
+
+class OutboxDeliverer:
+    """
+    Один проход доставки писем из исходящей очереди.
+    Письма захватываются пачками по MAILING_CLAIM_BATCH_SIZE (см. claim_outbox_messages), поэтому
+    процессов доставки может быть несколько. Результаты отправки (статусы писем в очереди и доставки
+    клиентам) сохраняются пачками после каждой пачки писем; в конце прохода для периодов рассылок,
+    все письма которых обработаны, сохраняются попытки рассылок (см. complete_outbox_slots).
+    Письмо, не отправленное из-за временной ошибки, остается в очереди только для адресов с ошибкой
+    и повторяется с экспоненциальной задержкой, не больше MAILING_RETRY_MAX_ATTEMPTS раз.
+    """
+
+    def __init__(self):
+        zone = pytz.timezone(settings.TIME_ZONE)
+        self.current_datetime = datetime.now(zone)
+        self.worker = get_worker_id()
+        self.delivery_log = DeliveryLog(settings.MAILING_DELIVERY_LOG_BATCH_SIZE)
+        self.rate_limiter = get_rate_limiter()
+        self.account = settings.EMAIL_HOST_USER or ''
+        self.failed_domains = set()
+        self.breaker = get_circuit_breaker()
+        self.acks = []
+        self.deferred = []
+        self.delivered_count = 0
+        self.renewed_at = time.monotonic()
+
+    def renew_claims(self):
+        """
+        Продлевает захваты писем процесса, если с прошлого продления прошла треть срока захвата.
+        Вызывается между письмами пачки и при получении результатов отправки.
+        """
+
+        if time.monotonic() - self.renewed_at >= settings.MAILING_CLAIM_LEASE_SECONDS / 3:
+            renew_outbox_messages(self.worker)
+            self.renewed_at = time.monotonic()
+
+    def on_result(self, outbox_message: OutboxMessage, result: SendResult):
+        self.renew_claims()
+        self.breaker.record(not is_server_failure(result))
+        if result.smtp_code in (421, 451):
+            self.rate_limiter.throttle(self.account)
+        if is_transient_failure(result):
+            self.failed_domains.add(outbox_message.domain)
+
+        retry_recipients = []
+        for client_id, email, status, smtp_code, error in iter_recipient_results(outbox_message.recipients, result):
+            if is_retryable(status, smtp_code):
+                retry_recipients.append([client_id, email])
+            self.delivery_log.add(outbox_message.mailing_id, client_id, outbox_message.slot, status, smtp_code, error)
+
+        outbox_message.attempts += 1
+        outbox_message.error = describe_failure(
+            f"Письмо {outbox_message.pk}", outbox_message.domain, outbox_message.recipients, result,
+        )
+        outbox_message.lease_expires_at = None
+        if retry_recipients and outbox_message.attempts < settings.MAILING_RETRY_MAX_ATTEMPTS:
+            outbox_message.recipients = retry_recipients
+            outbox_message.next_attempt_at = self.current_datetime + timedelta(
+                seconds=get_retry_delay(outbox_message.attempts - 1),
+            )
+        elif outbox_message.error:
+            outbox_message.status = OutboxMessage.STATUS_FAILED
+        else:
+            outbox_message.status = OutboxMessage.STATUS_SENT
+        self.acks.append(outbox_message)
+
+    def flush(self):
+        """
+        Сохраняет накопленные результаты отправки.
+        """
+
+        self.delivery_log.flush()
+        if self.acks:
+            OutboxMessage.objects.bulk_update(
+                self.acks,
+                ['recipients', 'status', 'attempts', 'next_attempt_at', 'error', 'lease_expires_at'],
             )
+            self.acks = []
+
+    def run(self) -> int:
+        """
+        Отправляет письма очереди, время отправки которых наступило. Возвращает кол-во отправленных писем.
+        """
+
+        try:
+            with Dispatcher(
+                    self.on_result,
+                    workers=settings.MAILING_DISPATCH_WORKERS,
+                    max_in_flight=settings.MAILING_DISPATCH_MAX_IN_FLIGHT,
+            ) as dispatcher:
+                while not self.rate_limiter.account_exhausted(self.account) and not self.breaker.is_blocked():
+                    outbox_messages = claim_outbox_messages(
+                        self.worker, self.current_datetime, settings.MAILING_CLAIM_BATCH_SIZE,
+                    )
+                    if not outbox_messages:
+                        break
+                    for outbox_message in outbox_messages:
+                        self.renew_claims()
+                        if outbox_message.domain in self.failed_domains or not self.rate_limiter.acquire(
+                                self.account, [email for _, email in outbox_message.recipients]) \
+                                or not self.breaker.allow():
+                            self.deferred.append(outbox_message.pk)  # отправится следующим проходом
+                            continue
+                        self.delivered_count += 1
+                        dispatcher.submit(outbox_message, SpooledEmailMessage(
+                            bytes(outbox_message.payload),
+                            outbox_message.from_email,
+                            [email for _, email in outbox_message.recipients],
+                        ))
+                    self.flush()
+            self.flush()
+            complete_outbox_slots(self.current_datetime)
+        finally:
+            release_outbox_messages(self.worker, self.deferred)
+            self.breaker.publish(self.worker)
+
+        return self.delivered_count
+
+
+def deliver_outbox() -> int:
+    """
+    Отправляет письма из исходящей очереди.
+    """
+
+    return OutboxDeliverer().run()
+
+
+def get_upcoming_events(current: datetime, limit: int) -> list:
+    """
+    Возвращает ближайшие события рассылок в виде кучи (min-heap) кортежей (время, событие, id рассылки):
+    старт созданных рассылок, окончание активных и очередные отправки запущенных.
+    Запущенные рассылки без рассчитанного времени отправки считаются готовыми к отправке сейчас.
+    """
+
+    active = Mailing.objects.exclude(is_disabled=True)
+    queries = (
+        ('start', 'start_mailing', active.filter(status_mailing='created')),
+        ('end', 'end_mailing', active.filter(status_mailing__in=('created', 'launched'))),
+        ('send', 'next_send_at', Mailing.objects.filter(status_mailing='launched', next_send_at__isnull=False)),
+    )
+
+    events = []
+    for event, field, queryset in queries:
+        for pk, event_time in queryset.order_by(field).values_list('pk', field)[:limit]:
+            events.append((event_time, event, pk))
+    unscheduled = Mailing.objects.filter(status_mailing='launched', next_send_at__isnull=True)
+    for pk in unscheduled.values_list('pk', flat=True)[:limit]:
+        events.append((current, 'send', pk))
+    heapq.heapify(events)
+
+    return events
+
+
+LEADER_LEASE_NAME = 'mailing-scheduler'
+
+
+def acquire_leadership(holder: str, current: datetime) -> bool:
+    """
+    Захватывает или продлевает роль ведущего планировщика на MAILING_LEADER_LEASE_SECONDS.
+    Возвращает True, если ведущим является процесс holder.
+    """
+
+    expires_at = current + timedelta(seconds=settings.MAILING_LEADER_LEASE_SECONDS)
+    updated = DispatcherLease.objects.filter(name=LEADER_LEASE_NAME).filter(
+        Q(holder=holder) | Q(expires_at__lte=current)
+    ).update(holder=holder, expires_at=expires_at)
+    if updated:
+        return True
+
+    try:
+        with transaction.atomic():
+            DispatcherLease.objects.create(name=LEADER_LEASE_NAME, holder=holder, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    return True
+
+
+def release_leadership(holder: str):
+    """
+    Отдает роль ведущего планировщика, чтобы другой процесс забрал ее без ожидания.
+    """
+
+    DispatcherLease.objects.filter(name=LEADER_LEASE_NAME, holder=holder).delete()
+
+
+def is_leader() -> bool:
+    """
+    Проверяет, что текущий процесс — ведущий планировщик, и продлевает его роль.
+    """
+
+    zone = pytz.timezone(settings.TIME_ZONE)
+    return acquire_leadership(get_worker_id(), datetime.now(zone))
+
+
+def run_change_mailing_status():
+    """
+    Задача планировщика: меняет статусы рассылок, если процесс — ведущий.
+    """
+
+    if is_leader():
+        change_mailing_status()
+
+
+def run_send_mailing():
+    """
+    Задача планировщика: отправляет рассылки, если процесс — ведущий.
+    """
+
+    if is_leader():
+        send_mailing()
 
 
 def start():
@@ -89,6 +1769,8 @@ def start():
     """
 
     scheduler = BackgroundScheduler()
-    scheduler.add_job(change_mailing_status, 'interval', seconds=60)
-    scheduler.add_job(send_mailing, 'interval', seconds=60)
+    scheduler.add_job(run_change_mailing_status, 'interval', seconds=60)
+    scheduler.add_job(run_send_mailing, 'interval', seconds=60)
+    if settings.MAILING_OUTBOX_ENABLED:
+        scheduler.add_job(deliver_outbox, 'interval', seconds=settings.MAILING_OUTBOX_POLL_INTERVAL)
     scheduler.start()
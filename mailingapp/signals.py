@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from mailingapp.models import Mailing, Attempt, Client, SiteCounter
+from mailingapp.services import notify_dispatcher, invalidate_attempt_stats, add_attempts_to_rollups, \
+    add_to_site_counter, refresh_site_counters
+
+
+@receiver(post_save, sender=Mailing)
+def mailing_saved(sender, created, **kwargs):
+    """
+    Будит диспетчер рассылок при изменении или отключении рассылки.
+    О новой рассылке диспетчер узнает после добавления клиентов, чтобы не отправить ее пустой.
+    """
+
+    if not created:
+        notify_dispatcher()
+
+
+@receiver(m2m_changed, sender=Mailing.clients.through)
+def mailing_clients_changed(sender, action, **kwargs):
+    """
+    Будит диспетчер рассылок при изменении списка клиентов рассылки.
+    """
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        notify_dispatcher()
+
+
+@receiver(post_delete, sender=Mailing)
+def mailing_deleted(sender, **kwargs):
+    """
+    Будит диспетчер рассылок при удалении рассылки.
+    """
+
+    notify_dispatcher()
+
+
+@receiver(post_save, sender=Attempt)
+@receiver(post_delete, sender=Attempt)
+def attempt_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш статистики попыток рассылки. Попытки, сохраненные через bulk_create,
+    сбрасывают кэш явно (см. complete_outbox_slots).
+    """
+
+    invalidate_attempt_stats([instance.mailing_id])
+
+
+@receiver(post_save, sender=Attempt)
+def attempt_created(sender, instance, created, **kwargs):
+    """
+    Добавляет новую попытку к дневным итогам рассылки. Попытки, сохраненные через bulk_create,
+    добавляются к итогам явно (см. complete_outbox_slots).
+    """
+
+    if created:
+        add_attempts_to_rollups([instance])
+
+
+@receiver(post_save, sender=Mailing)
+def mailing_counted(sender, created, **kwargs):
+    """
+    Обновляет счетчики рассылок главной страницы. Кол-во активных рассылок пересчитывается после коммита,
+    так как сохранение могло изменить статус или отключить рассылку.
+    """
+
+    if created:
+        add_to_site_counter(SiteCounter.MAILINGS, 1)
+    transaction.on_commit(lambda: refresh_site_counters([SiteCounter.ACTIVE_MAILINGS]))
+
+
+@receiver(post_delete, sender=Mailing)
+def mailing_uncounted(sender, **kwargs):
+    """
+    Обновляет счетчики рассылок главной страницы после удаления рассылки.
+    """
+
+    add_to_site_counter(SiteCounter.MAILINGS, -1)
+    transaction.on_commit(lambda: refresh_site_counters([SiteCounter.ACTIVE_MAILINGS]))
+
+
+@receiver(post_save, sender=Client)
+def client_counted(sender, created, **kwargs):
+    """
+    Увеличивает счетчик клиентов главной страницы при создании клиента.
+    """
+
+    if created:
+        add_to_site_counter(SiteCounter.CLIENTS, 1)
+
+
+@receiver(post_delete, sender=Client)
+def client_uncounted(sender, **kwargs):
+    """
+    Уменьшает счетчик клиентов главной страницы при удалении клиента.
+    """
+
+    add_to_site_counter(SiteCounter.CLIENTS, -1)
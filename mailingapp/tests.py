@@ -1,3 +1,581 @@
-from django.test import TestCase
+import email
+import email.policy
+import gzip
+import io
+import itertools
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from mailingapp import services
+from mailingapp.management.commands.benchdispatch import SinkServer
+from mailingapp.models import Mailing, MailingClaim, Attempt, AttemptSummary, Client, Message, Delivery, \
+    OutboxMessage, Suppression, CircuitBreakerState
+from mailingapp.services import claim_due_mailings, reschedule_mailing, renew_claims, release_claims, \
+    send_mailing_now, RateLimiter, get_attempt_stats, DispatchConnection, MailingSender, \
+    OutboxDeliverer, claim_outbox_messages, renew_outbox_messages
+
+
+def create_mailing(**kwargs) -> Mailing:
+    """
+    Создает запущенную рассылку, которую пора отправлять.
+    """
+
+    current = timezone.now()
+    fields = {
+        'start_mailing': current - timedelta(hours=1),
+        'end_mailing': current + timedelta(days=365),
+        'periodic_mailing': 'once a day',
+        'status_mailing': 'launched',
+    }
+    fields.update(kwargs)
+    return Mailing.objects.create(**fields)
+
+
+class RecordingSink(SinkServer):
+    """
+    Локальный SMTP-сервер для тестов: запоминает адреса доставленных писем и сами письма (received),
+    отклоняет адреса из refused
+    ({адрес: ответ сервера}), отвечает на все письма message_refusal, если он задан, и разрывает соединение
+    перед следующими disconnects письмами.
+    """
+
+    def __init__(self):
+        super().__init__(latency=0, failure_rate=0, transient_rate=0, seed=0)
+        self.delivered = []
+        self.received = []
+        self.refused = {}
+        self.message_refusal = None
+        self.data_count = 0
+        self.disconnects = 0
+
+    def should_disconnect(self) -> bool:
+        with self.lock:
+            if self.disconnects:
+                self.disconnects -= 1
+                return True
+        return False
+
+    def check_recipient(self, address: str):
+        return self.refused.get(address)
+
+    def check_message(self):
+        with self.lock:
+            self.data_count += 1
+        return self.message_refusal
+
+    def accept(self, recipients: list, data: bytes):
+        super().accept(recipients, data)
+        with self.lock:
+            self.delivered.extend(recipients)
+            self.received.append(email.message_from_bytes(data, policy=email.policy.default))
+
+
+class SmtpSinkTestCase(TestCase):
+    """
+    Тесты с отправкой писем через локальный SMTP-сервер RecordingSink.
+    """
+
+    def setUp(self):
+        self.sink = RecordingSink()
+        threading.Thread(target=self.sink.serve_forever, daemon=True).start()
+        self.addCleanup(self.sink.server_close)
+        self.addCleanup(self.sink.shutdown)
+        email_settings = self.settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.sink.server_address[1],
+            EMAIL_HOST_USER='sender@example.com',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_SSL=False,
+            EMAIL_USE_TLS=False,
+        )
+        email_settings.enable()
+        self.addCleanup(email_settings.disable)
+
+    @staticmethod
+    def create_mailing_with_clients(emails: list) -> Mailing:
+        """
+        Создает рассылку, которую пора отправлять, с клиентами emails.
+        """
+
+        mailing = create_mailing(message=Message.objects.create(message_title='Тема', message_text='Текст'))
+        mailing.clients.set([Client.objects.create(email_client=email) for email in emails])
+        return mailing
+
+
+class DispatchConnectionTest(SmtpSinkTestCase):
+    """
+    Соединение с почтовым сервером переиспользуется и восстанавливается после обрыва.
+    """
+
+    def test_reconnects_after_disconnect(self):
+        with DispatchConnection() as dispatch_connection:
+            dispatch_connection.send(EmailMessage('Тема', 'Текст', 'sender@example.com', ['a@example.com']))
+            dispatch_connection.send(EmailMessage('Тема', 'Текст', 'sender@example.com', ['b@example.com']))
+            self.sink.disconnects = 1
+            dispatch_connection.send(EmailMessage('Тема', 'Текст', 'sender@example.com', ['c@example.com']))
+
+            self.assertEqual(dispatch_connection.sent_counts, [2, 1])
+        self.assertEqual(self.sink.delivered, ['a@example.com', 'b@example.com', 'c@example.com'])
+
+
+class DeliveryTest(SmtpSinkTestCase):
+    """
+    Доставка учитывается по каждому клиенту, повтор уходит только клиентам с временной ошибкой.
+    """
+
+    def test_retry_sends_only_to_pending_clients(self):
+        mailing = self.create_mailing_with_clients(['a@example.com', 'b@example.com', 'c@example.com'])
+        self.sink.refused = {'b@example.com': '450 mailbox busy', 'c@example.com': '550 no such user'}
+
+        MailingSender().run()
+
+        self.assertEqual(self.sink.delivered, ['a@example.com'])
+        deliveries = dict(Delivery.objects.values_list('client__email_client', 'smtp_code'))
+        self.assertEqual(deliveries, {'a@example.com': None, 'b@example.com': 450, 'c@example.com': 550})
+        mailing.refresh_from_db()
+        self.assertEqual(mailing.retry_count, 1)
+
+        self.sink.refused = {}
+        Mailing.objects.filter(pk=mailing.pk).update(next_send_at=timezone.now())  # время повтора наступило
+        MailingSender().run()
+
+        self.assertEqual(self.sink.delivered, ['a@example.com', 'b@example.com'])
+        mailing.refresh_from_db()
+        self.assertEqual(mailing.retry_count, 0)
+        self.assertIsNone(mailing.current_slot)
+
+    def test_deliveries_are_saved_with_attempt(self):
+        self.create_mailing_with_clients(['a@example.com', 'b@example.com'])
+        self.sink.refused = {'b@example.com': '450 mailbox busy'}
+        saved_counts = []
+
+        def record_attempt(*args, **kwargs):
+            saved_counts.append(Delivery.objects.count())  # после сохранения попытки процесс может упасть
+            return original_record_attempt(*args, **kwargs)
+
+        original_record_attempt = services.record_attempt
+        with mock.patch('mailingapp.services.record_attempt', side_effect=record_attempt):
+            MailingSender().run()
+
+        self.assertEqual(saved_counts, [2])
+
+
+class ClaimedMailingSendTest(SmtpSinkTestCase):
+    """
+    Рассылку, захваченную другим процессом, не отправляет никто другой, а отправленную — не отправляют повторно.
+    """
+
+    def test_claimed_mailing_is_sent_once(self):
+        self.create_mailing_with_clients(['a@example.com', 'b@example.com'])
+        claim_due_mailings('other', timezone.now(), 10)
+
+        MailingSender().run()
+        self.assertEqual(self.sink.delivered, [])
+
+        release_claims('other')  # другой процесс отпустил рассылку, не отправив ее
+        MailingSender().run()
+        MailingSender().run()
+        self.assertEqual(sorted(self.sink.delivered), ['a@example.com', 'b@example.com'])
+
+
+class MessagePayloadTest(SmtpSinkTestCase):
+    """
+    Собранное MIME-сообщение переиспользуется, пока сообщение не изменено, а после изменения собирается заново.
+    """
+
+    def test_edited_message_is_sent_with_new_payload(self):
+        mailing = self.create_mailing_with_clients(['a@example.com'])
+        MailingSender().run()
+
+        message = mailing.message
+        message.message_title, message.message_text = 'Новая тема', 'Новый текст'
+        message.save()
+        self.assertEqual(message.version, 2)
+        create_mailing(message=message).clients.set(Client.objects.all())
+        MailingSender().run()
+
+        sent = [(received['Subject'], received.get_content()) for received in self.sink.received]
+        self.assertEqual(sent, [('Тема', 'Текст'), ('Новая тема', 'Новый текст')])
+
+
+class PersonalizedMessageTest(SmtpSinkTestCase):
+    """
+    Персонализированное сообщение отправляется отдельным письмом каждому клиенту с его полями.
+    """
+
+    def test_each_client_gets_own_text(self):
+        message = Message.objects.create(message_title='Тема', message_text='Здравствуйте, {{ first_name }}!')
+        mailing = create_mailing(message=message)
+        mailing.clients.set([
+            Client.objects.create(email_client='a@example.com', first_name='Анна'),
+            Client.objects.create(email_client='b@example.com'),
+        ])
+
+        MailingSender().run()
+
+        sent = {received['To']: received.get_content() for received in self.sink.received}
+        self.assertEqual(sent, {'a@example.com': 'Здравствуйте, Анна!', 'b@example.com': 'Здравствуйте, !'})
+
+
+class SuppressionTest(SmtpSinkTestCase):
+    """
+    Адреса из стоп-листа пропускаются при отправке без учета регистра, изменения стоп-листа видны следующему проходу.
+    """
+
+    def test_suppressed_addresses_are_skipped(self):
+        self.create_mailing_with_clients(['a@example.com', 'B@example.com', 'c@example.com'])
+        Suppression.objects.create(email='b@example.com')
+        Suppression.objects.create(email='c@example.com', reason='unsubscribe')
+
+        MailingSender().run()
+        self.assertEqual(self.sink.delivered, ['a@example.com'])
+        self.assertEqual(Delivery.objects.count(), 1)
+
+        Suppression.objects.filter(email='c@example.com').delete()  # клиент снова подписался
+        create_mailing(message=Message.objects.create(message_title='Тема', message_text='Текст')).clients.set(
+            Client.objects.all(),
+        )
+        MailingSender().run()
+        self.assertEqual(self.sink.delivered, ['a@example.com', 'a@example.com', 'c@example.com'])
+
+
+@override_settings(MAILING_BREAKER_WINDOW=2, MAILING_BREAKER_MIN_REQUESTS=2, MAILING_BREAKER_FAILURE_RATE=0.5)
+class CircuitBreakerTest(SmtpSinkTestCase):
+    """
+    При сбоях почтового сервера предохранитель размыкается и письма откладываются без обращения к серверу,
+    а после паузы пробное письмо возобновляет отправку.
+    """
+
+    def setUp(self):
+        super().setUp()
+        breaker = mock.patch('mailingapp.services._circuit_breaker', None)  # у каждого теста свой предохранитель
+        breaker.start()
+        self.addCleanup(breaker.stop)
+
+    def test_open_breaker_defers_sends_until_probe_succeeds(self):
+        emails = [f'client@example{number}.com' for number in range(5)]
+        mailing = self.create_mailing_with_clients(emails)
+        self.sink.message_refusal = '452 insufficient system storage'
+
+        MailingSender().run()
+        MailingSender().run()  # пока предохранитель разомкнут, рассылки не захватываются
+
+        self.assertEqual(self.sink.data_count, 2)
+        self.assertEqual(CircuitBreakerState.objects.get().state, 'open')
+        self.assertEqual(Delivery.objects.filter(status=Delivery.STATUS_FAILED).count(), 2)
+
+        self.sink.message_refusal = None
+        services._circuit_breaker.opened_monotonic -= settings.MAILING_BREAKER_OPEN_SECONDS  # пауза прошла
+        Mailing.objects.filter(pk=mailing.pk).update(next_send_at=timezone.now())
+        MailingSender().run()
+
+        self.assertEqual(sorted(self.sink.delivered), emails)
+        self.assertEqual(CircuitBreakerState.objects.get().state, 'closed')
+
+
+@override_settings(MAILING_OUTBOX_ENABLED=True)
+class OutboxLeaseTest(SmtpSinkTestCase):
+    """
+    Захваты писем исходящей очереди продлеваются, пока процесс доставки отправляет пачку.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.create_mailing_with_clients(['a@example.com', 'b@example.org'])
+        MailingSender().run()  # письма рассылки записываются в очередь, по одному на домен
+
+    def test_claims_are_renewed_while_sending(self):
+        # каждый вызов monotonic «проходит» треть срока захвата, поэтому продлевается при каждой возможности
+        with mock.patch('mailingapp.services.time.monotonic', side_effect=itertools.count(step=1000)), \
+                mock.patch('mailingapp.services.renew_outbox_messages',
+                           wraps=services.renew_outbox_messages) as renew_outbox_messages:
+            OutboxDeliverer().run()
+
+        self.assertEqual(sorted(self.sink.delivered), ['a@example.com', 'b@example.org'])
+        self.assertEqual(renew_outbox_messages.call_count, 4)  # перед отправкой и после результата каждого письма
+
+    def test_only_own_live_claims_are_renewed(self):
+        current = timezone.now()
+        own, other = claim_outbox_messages('worker', current, 10)
+        OutboxMessage.objects.filter(pk=other.pk).update(worker='other')
+
+        self.assertEqual(renew_outbox_messages('worker'), 1)
+        own.refresh_from_db()
+        self.assertGreater(own.lease_expires_at, current + timedelta(seconds=settings.MAILING_CLAIM_LEASE_SECONDS))
+
+        OutboxMessage.objects.filter(pk=own.pk).update(lease_expires_at=current)  # захват истек
+        self.assertEqual(renew_outbox_messages('worker'), 0)
+
+
+@override_settings(MAILING_OUTBOX_ENABLED=True)
+class OutboxDeliveryTest(SmtpSinkTestCase):
+    """
+    Письма из исходящей очереди доставляются один раз, повторяются только адресам с временной ошибкой,
+    а попытка рассылки сохраняется, когда обработаны все письма периода.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.mailing = self.create_mailing_with_clients(['a@example.com', 'b@example.com'])
+        MailingSender().run()
+
+    def test_retry_sends_only_to_refused_recipients(self):
+        self.sink.refused = {'b@example.com': '450 mailbox busy'}
+        OutboxDeliverer().run()
+
+        self.assertEqual(self.sink.delivered, ['a@example.com'])
+        outbox_message, = OutboxMessage.objects.all()
+        self.assertEqual([email for _, email in outbox_message.recipients], ['b@example.com'])
+        self.assertFalse(Attempt.objects.exists())  # период еще доставляется
+
+        self.sink.refused = {}
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())  # время повтора наступило
+        OutboxDeliverer().run()
+
+        self.assertEqual(self.sink.delivered, ['a@example.com', 'b@example.com'])
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(list(Attempt.objects.values_list('mailing', 'status_attempt')),
+                         [(self.mailing.pk, 'Successfully')])
+
+    def test_slot_left_by_failed_run_is_completed(self):
+        with mock.patch('mailingapp.services.complete_outbox_slots', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):  # проход прервался после подтверждения писем
+                OutboxDeliverer().run()
+        self.assertFalse(Attempt.objects.exists())
+
+        OutboxDeliverer().run()
+
+        self.assertEqual(self.sink.delivered, ['a@example.com', 'b@example.com'])
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(Attempt.objects.filter(mailing=self.mailing).count(), 1)
+
+
+class MailingScheduleEditTest(TestCase):
+    """
+    Изменение старта или периодичности рассылки из любого места сбрасывает ее расписание и повторы.
+    """
+
+    def setUp(self):
+        mailing = create_mailing()
+        Mailing.objects.filter(pk=mailing.pk).update(current_slot=mailing.next_send_at, retry_count=2)
+        self.mailing = Mailing.objects.get(pk=mailing.pk)
+
+    def test_period_change_resets_schedule(self):
+        self.mailing.periodic_mailing = 'once a week'
+        self.mailing.save()
+
+        self.mailing.refresh_from_db()
+        self.assertIsNone(self.mailing.next_send_at)
+        self.assertIsNone(self.mailing.current_slot)
+        self.assertEqual(self.mailing.retry_count, 0)
+
+    def test_other_changes_keep_schedule(self):
+        next_send_at = self.mailing.next_send_at
+        self.mailing.is_disabled = True
+        self.mailing.save()
+
+        self.mailing.refresh_from_db()
+        self.assertEqual(self.mailing.next_send_at, next_send_at)
+        self.assertEqual(self.mailing.retry_count, 2)
+
+
+@override_settings(MAILING_SEND_WINDOW_SECONDS=3600)
+class SendWindowScheduleTest(TestCase):
+    """
+    Расписание рассылки с окном отправки не уплывает от периода к периоду.
+    """
+
+    def test_late_ticks_do_not_shift_schedule(self):
+        mailing = create_mailing()
+        period = Mailing.PERIOD_DELTAS['once a day']
+        mailing.next_send_at = mailing.get_next_send_at(timezone.now() - period)
+        mailing.save()
+        first_send_at = mailing.next_send_at
+
+        for number in range(5):
+            current = mailing.next_send_at + timedelta(seconds=20)  # проход планировщика опаздывает
+            claimed, = claim_due_mailings('worker', current, 10)
+            reschedule_mailing(claimed, claimed.current_slot, current)
+            mailing.refresh_from_db()
+            self.assertEqual(mailing.next_send_at, first_send_at + period * (number + 1))
+
+    def test_missed_periods_are_not_caught_up(self):
+        mailing = create_mailing()
+        period = Mailing.PERIOD_DELTAS['once a day']
+        first_send_at = mailing.next_send_at
+
+        current = first_send_at + period * 3 + timedelta(minutes=5)  # диспетчер стоял три дня
+        claimed, = claim_due_mailings('worker', current, 10)
+        reschedule_mailing(claimed, claimed.current_slot, current)
+        mailing.refresh_from_db()
+        self.assertGreater(mailing.next_send_at, current)
+        self.assertLessEqual(mailing.next_send_at - current, period + timedelta(seconds=1800))  # плюс половина окна
+
+
+class MailingClaimTest(TestCase):
+    """
+    Захваченную рассылку не забирает другой процесс, пока захват действует или продлевается.
+    """
+
+    def test_claim_from_long_tick_is_not_expired(self):
+        create_mailing()
+        tick_started = timezone.now() - timedelta(hours=1)  # проход длится дольше срока захвата
+
+        self.assertEqual(len(claim_due_mailings('first', tick_started, 10)), 1)
+        self.assertEqual(claim_due_mailings('second', timezone.now(), 10), [])
+
+    def test_renewed_claim_is_not_taken_over(self):
+        create_mailing()
+        claim_due_mailings('first', timezone.now(), 10)
+        MailingClaim.objects.update(lease_expires_at=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual(renew_claims('first'), 1)
+        claim = MailingClaim.objects.get()
+        self.assertGreater(claim.lease_expires_at, timezone.now() + timedelta(seconds=60))
+        self.assertEqual(claim_due_mailings('second', timezone.now(), 10), [])
+
+    def test_released_claim_is_taken_over(self):
+        create_mailing()
+        claim_due_mailings('first', timezone.now(), 10)
+
+        self.assertEqual(release_claims('first'), 1)
+        self.assertEqual(len(claim_due_mailings('second', timezone.now(), 10)), 1)
+        self.assertEqual(MailingClaim.objects.get().worker, 'second')
+
+
+class SendMailingNowTest(TestCase):
+    """
+    Немедленная отправка ставит рассылку диспетчеру и не повторяется в том же периоде.
+    """
+
+    def test_send_now_is_refused_in_same_period(self):
+        mailing = create_mailing(status_mailing='created', start_mailing=timezone.now() + timedelta(days=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(send_mailing_now(mailing.pk))
+        self.assertFalse(Attempt.objects.exists())  # сам вызов ничего не отправляет
+
+        current = timezone.now()
+        claimed, = claim_due_mailings('worker', current, 10)
+        reschedule_mailing(claimed, claimed.current_slot, current)  # диспетчер отправил период
+
+        self.assertFalse(send_mailing_now(mailing.pk))
+        mailing.refresh_from_db()
+        self.assertGreater(mailing.next_send_at, current)
+
+
+class RateLimiterTest(TestCase):
+    """
+    Корзины ограничения скорости общие для всех процессов отправки.
+    """
+
+    def test_limit_is_shared_between_processes(self):
+        first, second = RateLimiter(0.001, 3, 0, 1), RateLimiter(0.001, 3, 0, 1)  # ограничители двух процессов
+
+        self.assertTrue(first.acquire('sender@example.com', ['a@example.com'], messages=2))
+        self.assertFalse(second.acquire('sender@example.com', ['b@example.com'], messages=2))
+        self.assertTrue(second.acquire('sender@example.com', ['b@example.com']))
+        self.assertTrue(first.account_exhausted('sender@example.com'))
+
+    def test_failed_acquire_takes_nothing(self):
+        limiter = RateLimiter(0.001, 3, 0.001, 2)
+        self.assertTrue(limiter.acquire('sender@example.com', ['c@other.com', 'd@other.com']))
+
+        self.assertFalse(limiter.acquire('sender@example.com', ['a@example.com', 'e@other.com']))
+        self.assertTrue(limiter.acquire('sender@example.com', ['a@example.com', 'b@example.com'], messages=2))
+
+
+class ArchiveAttemptsTest(TestCase):
+    """
+    Старые попытки переносятся в архив и в итоги рассылки, последняя попытка рассылки остается.
+    """
+
+    def test_old_attempts_are_archived(self):
+        mailing = create_mailing()
+        current = timezone.now()
+        for days, status in ((40, 'Successfully'), (50, 'Successfully'), (60, 'Successfully'), (70, 'Not successful')):
+            Attempt.objects.create(mailing=mailing, status_attempt=status, last_attempt=current - timedelta(days))
+        output_dir = tempfile.mkdtemp()
+
+        call_command('archiveattempts', days=30, batch_size=2, output_dir=output_dir, stdout=io.StringIO())
+
+        self.assertEqual(Attempt.objects.get().last_attempt, current - timedelta(40))
+        summary = AttemptSummary.objects.get(mailing=mailing)
+        self.assertEqual((summary.successful_count, summary.failed_count), (2, 1))
+        self.assertEqual(summary.last_success, current - timedelta(50))
+        archive, = Path(output_dir).iterdir()
+        with gzip.open(archive) as lines:
+            self.assertEqual(len([json.loads(line) for line in lines]), 3)
+
+
+class BackfillEmailDomainsTest(TestCase):
+    """
+    Команда backfillemaildomains заполняет домен у клиентов, сохраненных без него.
+    """
+
+    def test_domains_are_filled(self):
+        for number in range(5):
+            Client.objects.create(email_client=f'client{number}@Example{number % 2}.com')
+        Client.objects.update(email_domain=None)
+
+        call_command('backfillemaildomains', batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(Client.objects.values_list('email_domain', flat=True)),
+            ['example0.com'] * 3 + ['example1.com'] * 2,
+        )
+
+
+@override_settings(MAILING_STATS_HISTOGRAM_DAYS=7)
+class AttemptStatsTest(TestCase):
+    """
+    Статистика попыток считается по всей истории, а гистограмма — только за последние дни.
+    """
+
+    def test_histogram_is_limited_to_recent_days(self):
+        mailing = create_mailing()
+        current = timezone.now()
+        for days in range(30):
+            status = 'Not successful' if days == 20 else 'Successfully'
+            Attempt.objects.create(mailing=mailing, status_attempt=status, last_attempt=current - timedelta(days))
+
+        stats = get_attempt_stats(mailing)
+
+        self.assertEqual((stats['total'], stats['successful']), (30, 29))
+        self.assertEqual(stats['last_success'], current)
+        self.assertEqual(stats['last_failure'], current - timedelta(20))
+        self.assertEqual(len(stats['days']), 7)
+
+    @override_settings(CACHE_ENABLED=True)
+    def test_process_local_cache_is_not_used(self):
+        mailing = create_mailing()
+        get_attempt_stats(mailing)
+        # попытку записал другой процесс: сброс его кэша в памяти сюда не доходит
+        Attempt.objects.bulk_create([
+            Attempt(mailing=mailing, status_attempt='Successfully', last_attempt=timezone.now()),
+        ])
+
+        self.assertEqual(get_attempt_stats(mailing)['total'], 1)
+
+    def test_shared_cache_is_invalidated_by_new_attempts(self):
+        mailing = create_mailing()
+        with tempfile.TemporaryDirectory() as location, self.settings(CACHE_ENABLED=True, CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            get_attempt_stats(mailing)
+            with self.assertNumQueries(0):
+                self.assertEqual(get_attempt_stats(mailing)['total'], 0)
+
+            Attempt.objects.create(mailing=mailing, status_attempt='Successfully', last_attempt=timezone.now())
+            self.assertEqual(get_attempt_stats(mailing)['total'], 1)
@@ -1,24 +1,26 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from mailingapp.apps import MailingappConfig
 from mailingapp.views import MailingListView, MailingCreateView, MailingUpdateView, MailingDetailView, \
     MailingDeleteView, ClientListView, ClientCreateView, ClientUpdateView, ClientDetailView, ClientDeleteView, \
     MessageListView, MessageCreateView, MessageUpdateView, MessageDetailView, MessageDeleteView, IndexView, \
-    disabled_mailing, AttemptDetailView, AttemptListView
+    disabled_mailing, AttemptDetailView, AttemptListView, mailing_send_now, api_mailing_send_now, DashboardView
 
 app_name = MailingappConfig.name
 
 urlpatterns = [
-    path("", cache_page(10)(IndexView.as_view()), name='index'),
+    path("", IndexView.as_view(), name='index'),
 
     path("mailing/list/", MailingListView.as_view(), name='mailing_list'),
     path("mailing/create/", MailingCreateView.as_view(), name='mailing_create'),
     path("mailing/update/<int:pk>/", MailingUpdateView.as_view(), name='mailing_update'),
     path("mailing/detail/<int:pk>/", MailingDetailView.as_view(), name='mailing_detail'),
     path("mailing/delete/<int:pk>/", MailingDeleteView.as_view(), name='mailing_delete'),
+    path("mailing/dashboard/", DashboardView.as_view(), name='dashboard'),
 
     path('disabled/<int:pk>/', disabled_mailing, name='mailing_disabled'),
+    path('mailing/send-now/<int:pk>/', mailing_send_now, name='mailing_send_now'),
+    path('api/mailing/<int:pk>/send-now/', api_mailing_send_now, name='api_mailing_send_now'),
 
     path("client/list/", ClientListView.as_view(), name='client_list'),
     path("client/create/", ClientCreateView.as_view(), name='client_create'),
@@ -1,13 +1,21 @@
+from datetime import datetime, time, timedelta
+
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
+from django.db.models import Sum
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
 from django.urls import reverse_lazy, reverse
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DetailView, DeleteView
 
-from blogapp.models import Article
-from mailingapp.forms import MailingForm, ClientForm, MessageForm
-from mailingapp.models import Mailing, Message, Client, Attempt
+from blogapp.services import get_random_articles
+from mailingapp.forms import MailingForm, ClientForm, MessageForm, AttemptFilterForm
+from mailingapp.models import Mailing, Message, Client, Attempt, AttemptRollup, SiteCounter
+from mailingapp.pagination import paginate_keyset
+from mailingapp.services import send_mailing_now, get_attempt_stats, get_site_counters
 
 
 class IndexView(TemplateView):
@@ -20,14 +28,15 @@ class IndexView(TemplateView):
     def get_context_data(self, **kwargs):
         """
         Возвращает кол-во всего рассылок, активных рассылок, уникальных клиентов и 3 случайных статьи из блога.
+        Кол-ва берутся из счетчиков, обновляемых при изменении данных (см. get_site_counters).
         """
 
         context = super().get_context_data(**kwargs)
-        context['mailing_count'] = Mailing.objects.all().count()
-        context['mailing_active_count'] = Mailing.objects.all().filter(status_mailing='launched')\
-            .filter(is_disabled=False).count()
-        context['client_count'] = Client.objects.all().count()
-        context["article_order_list"] = Article.objects.order_by('?')[:3]
+        counters = get_site_counters()
+        context['mailing_count'] = counters[SiteCounter.MAILINGS]
+        context['mailing_active_count'] = counters[SiteCounter.ACTIVE_MAILINGS]
+        context['client_count'] = counters[SiteCounter.CLIENTS]
+        context["article_order_list"] = get_random_articles(3)
         return context
 
 
@@ -128,10 +137,11 @@ class MailingDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView)
 
     model = Mailing
     permission_required = 'mailingapp.view_mailing'
+    attempts_page_size = 10
 
     def get_context_data(self, **kwargs):
         """
-        Отображает попытки рассылок.
+        Отображает статистику и постранично последние попытки рассылки.
         """
 
         user = self.request.user
@@ -140,7 +150,13 @@ class MailingDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView)
             if user.is_superuser \
                     or user.has_perm('mailingapp.view_mailing') \
                     or user.id == self.object.user_id:
-                context_data['attempts'] = Attempt.objects.filter(mailing=self.object).order_by('-last_attempt')
+                page = paginate_keyset(
+                    Attempt.objects.filter(mailing=self.object), 'last_attempt', self.attempts_page_size,
+                    after=self.request.GET.get('after'), before=self.request.GET.get('before'),
+                )
+                context_data['attempts'] = page.object_list
+                context_data['attempts_page'] = page
+                context_data['attempt_stats'] = get_attempt_stats(self.object)
                 return context_data
         raise PermissionDenied
 
@@ -173,6 +189,56 @@ def disabled_mailing(request, pk):
     return redirect(reverse('mailingapp:mailing_detail', args=[pk])) # возвращает страницу измененной рассылки
 
 
+def can_send_mailing(user, mailing: Mailing) -> bool:
+    """
+    Проверяет, что пользователь может отправить рассылку: свою или любую при правах менеджера.
+    """
+
+    if not user.has_perm('mailingapp.change_mailing'):
+        return False
+    return user.is_superuser or user.has_perm('usersapp.сan_block_user') or mailing.user_id == user.id
+
+
+@login_required
+@require_POST
+def mailing_send_now(request, pk):
+    """
+    Контроллер для немедленной отправки рассылки.
+    """
+
+    mailing_item = get_object_or_404(Mailing, pk=pk)
+    if not can_send_mailing(request.user, mailing_item):
+        raise PermissionDenied
+
+    send_mailing_now(pk)
+
+    return redirect(reverse('mailingapp:mailing_detail', args=[pk]))
+
+
+@require_POST
+def api_mailing_send_now(request, pk):
+    """
+    API для немедленной отправки рассылки.
+    Отвечает 202, если рассылка поставлена в отправку, и 409, если она отключена, завершена
+    или уже отправлена в текущем периоде.
+    """
+
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Требуется авторизация.'}, status=401)
+    mailing_item = Mailing.objects.filter(pk=pk).first()
+    if mailing_item is None:
+        return JsonResponse({'detail': 'Рассылка не найдена.'}, status=404)
+    if not can_send_mailing(request.user, mailing_item):
+        return JsonResponse({'detail': 'Недостаточно прав.'}, status=403)
+
+    if send_mailing_now(pk):
+        return JsonResponse({'id': pk, 'queued': True}, status=202)
+    return JsonResponse(
+        {'id': pk, 'queued': False, 'detail': 'Рассылка отключена, завершена или уже отправлена в текущем периоде.'},
+        status=409,
+    )
+
+
 class ClientListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     """
     Контроллер для вывода списка клиентов.
@@ -331,7 +397,83 @@ class AttemptDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView)
 class AttemptListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     """
     Контроллер для вывода списка попыток.
+    Попытки выводятся постранично по ключу (last_attempt, id) от новых к старым, см. paginate_keyset.
     """
 
     model = Attempt
     permission_required = 'mailingapp.view_mailing'
+    page_size = 50
+
+    def get_queryset(self):
+        """
+        Фильтрует попытки по рассылке, статусу и периоду дат.
+        """
+
+        queryset = Attempt.objects.select_related('mailing')
+        self.filter_form = AttemptFilterForm(self.request.GET or None)
+        if self.filter_form.is_valid():
+            data = self.filter_form.cleaned_data
+            if data['mailing']:
+                queryset = queryset.filter(mailing_id=data['mailing'])
+            if data['status']:
+                queryset = queryset.filter(status_attempt=data['status'])
+            # границы периода — моменты времени, а не __date, чтобы использовался индекс по last_attempt
+            if data['date_from']:
+                queryset = queryset.filter(
+                    last_attempt__gte=timezone.make_aware(datetime.combine(data['date_from'], time.min)),
+                )
+            if data['date_to']:
+                next_day = data['date_to'] + timedelta(days=1)
+                queryset = queryset.filter(last_attempt__lt=timezone.make_aware(datetime.combine(next_day, time.min)))
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        """
+        Возвращает страницу попыток, курсоры соседних страниц и фильтры.
+        """
+
+        page = paginate_keyset(
+            self.object_list, 'last_attempt', self.page_size,
+            after=self.request.GET.get('after'), before=self.request.GET.get('before'),
+        )
+        context_data = super().get_context_data(object_list=page.object_list, **kwargs)
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        context_data['page'] = page
+        context_data['filter_form'] = self.filter_form
+        context_data['filter_query'] = query.urlencode()
+        return context_data
+
+
+class DashboardView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
+    """
+    Контроллер для вывода аналитики рассылок за последние days дней.
+    Данные берутся только из дневных итогов (AttemptRollup), а не из попыток.
+    """
+
+    template_name = "mailingapp/dashboard.html"
+    permission_required = 'mailingapp.view_mailing'
+    days = 30
+
+    def get_context_data(self, **kwargs):
+        """
+        Возвращает итоги по дням, по пользователям (для менеджеров) и по рассылкам.
+        """
+
+        user = self.request.user
+        context_data = super().get_context_data(**kwargs)
+        rollups = AttemptRollup.objects.filter(date__gt=timezone.localdate() - timedelta(days=self.days))
+        is_manager = user.is_superuser or user.has_perm('usersapp.сan_block_user')
+        if not is_manager:
+            rollups = rollups.filter(user=user)
+
+        totals = {'successful': Sum('successful_count'), 'failed': Sum('failed_count')}
+        context_data['days'] = self.days
+        context_data['totals'] = rollups.aggregate(**totals)
+        context_data['by_date'] = rollups.values('date').annotate(**totals).order_by('-date')
+        by_mailing = rollups.values('mailing_id').annotate(**totals)
+        context_data['by_mailing'] = by_mailing.order_by('-failed', '-successful')[:20]
+        if is_manager:
+            context_data['by_user'] = rollups.values('user__email').annotate(**totals).order_by('-successful')[:20]
+        return context_data